@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Message, MessageFile, MessageVersion, Conversation, DocumentChunk
+from .models import Message, MessageFile, MessageVersion, Conversation, DocumentChunk, FileBlob, IngestionJob, FailedChunk, EmbeddingCache, ResponseCache, Tombstone
 
 admin.site.register(MessageVersion)
 admin.site.register(Message)
 admin.site.register(MessageFile)
 admin.site.register(Conversation)
 admin.site.register(DocumentChunk)
+admin.site.register(FileBlob)
+admin.site.register(IngestionJob)
+admin.site.register(FailedChunk)
+admin.site.register(EmbeddingCache)
+admin.site.register(ResponseCache)
+admin.site.register(Tombstone)
@@ -0,0 +1,285 @@
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from chat.management.openai_stub import StubOpenAIServer, stub_embedding, stub_text
+from chat.models import Conversation, DocumentChunk, EmbeddingCache, FileBlob, Message, MessageFile
+from chat.utils.embedding_cache import endpoint_cache_key
+from chat.utils.llm_gateway import reset_clients
+from chat.utils.vector_search import search_setting
+
+SCENARIOS = ['chat_completion', 'search_context', 'upload', 'conversation_list', 'fork']
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed throwaway users and drive the chat API in-process at a given concurrency '
+        'against a local stub OpenAI server; prints latency percentiles and throughput as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--conversations', type=int, default=20, help='Per user')
+        parser.add_argument('--messages', type=int, default=20, help='Per conversation')
+        parser.add_argument('--chunks', type=int, default=50, help='Document chunks per conversation')
+        parser.add_argument('--requests', type=int, default=200, help='Per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unrecorded requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--chat-latency-ms', type=float, default=200)
+        parser.add_argument('--embedding-latency-ms', type=float, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the report to this file')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users and their data')
+
+    def handle(self, *args, **options):
+        dims = search_setting('DIMENSIONS')
+        stub = StubOpenAIServer(
+            chat_latency=options['chat_latency_ms'] / 1000,
+            embedding_latency=options['embedding_latency_ms'] / 1000,
+            dimensions=dims
+        )
+        # Keep query logging out of the timings
+        with override_settings(DEBUG=False), stub:
+            started = time.perf_counter()
+            users = self._seed(options, dims)
+            seed_seconds = time.perf_counter() - started
+            self.stderr.write(f"Seeded {len(users)} users in {seed_seconds:.1f}s")
+            try:
+                results = {}
+                for name in options['scenarios']:
+                    scenario = getattr(self, f'_{name}')
+                    self._run(scenario, users, stub, options['warmup'], options['concurrency'], (options['seed'], 1))
+                    results[name] = self._run(
+                        scenario, users, stub, options['requests'], options['concurrency'], (options['seed'], 0)
+                    )
+                    if results[name] is None:
+                        continue
+                    self.stderr.write(
+                        f"{name:>18}: p50 {results[name]['p50_ms']:8.1f}ms  p95 {results[name]['p95_ms']:8.1f}ms  "
+                        f"{results[name]['throughput_rps']:7.1f} req/s  {results[name]['errors']} errors"
+                    )
+            finally:
+                reset_clients()
+                if not options['keep']:
+                    for user in users:
+                        user['user'].delete()
+                    # Stub vectors are cached under the stub's own endpoint;
+                    # drop them with the rest of the run
+                    EmbeddingCache.objects.filter(model=endpoint_cache_key(stub.base_url)).delete()
+
+        report = {
+            'config': {
+                key: options[key] for key in (
+                    'users', 'conversations', 'messages', 'chunks', 'requests', 'concurrency',
+                    'chat_latency_ms', 'embedding_latency_ms', 'seed'
+                )
+            },
+            'seed_seconds': round(seed_seconds, 3),
+            'stub_calls': dict(stub.calls),
+            'scenarios': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def _seed(self, options, dims):
+        rng_seed = options['seed']
+        run = uuid.uuid4().hex[:8]
+        user_model = get_user_model()
+        users = []
+        for u in range(options['users']):
+            username = f"bench-{run}-{u}"
+            user = user_model.objects.create_user(username=username, email=f"{username}@example.invalid")
+            token = Token.objects.create(user=user)
+            with transaction.atomic():
+                conversations = Conversation.objects.bulk_create([
+                    Conversation(user=user, title=f"Benchmark {c}") for c in range(options['conversations'])
+                ])
+                messages = Message.objects.bulk_create([
+                    Message(
+                        conversation=conversation,
+                        role='user' if m % 2 == 0 else 'assistant',
+                        content=stub_text((rng_seed, u, conversation.id, m), 40)
+                    )
+                    for conversation in conversations
+                    for m in range(options['messages'])
+                ], batch_size=1000)
+                first_messages = {}
+                for message in messages:
+                    first_messages.setdefault(message.conversation_id, message)
+
+                if options['chunks'] and options['messages']:
+                    self._seed_chunks(user, conversations, first_messages, options['chunks'], dims, (rng_seed, u))
+            users.append({
+                'user': user,
+                'auth': f"Token {token.key}",
+                'conversations': [c.id for c in conversations],
+                'user_messages': [m.id for m in messages if m.role == 'user'],
+            })
+        return users
+
+    def _seed_chunks(self, user, conversations, first_messages, chunks_per_file, dims, seed):
+        # One document per conversation, attached to its first message
+        blobs = FileBlob.objects.bulk_create([
+            FileBlob(
+                user=user,
+                sha256=hashlib.sha256(f"{seed}-{conversation.id}".encode('utf-8')).hexdigest(),
+                status='ready',
+                ref_count=1
+            )
+            for conversation in conversations
+        ])
+        MessageFile.objects.bulk_create([
+            MessageFile(
+                message=first_messages[conversation.id],
+                blob=blob,
+                file_name=f"benchmark-{conversation.id}.txt",
+                file_type='text/plain'
+            )
+            for conversation, blob in zip(conversations, blobs)
+        ])
+        chunks = []
+        for blob in blobs:
+            for i in range(chunks_per_file):
+                content = stub_text((*seed, blob.id, i), 80)
+                chunks.append(DocumentChunk(
+                    blob=blob,
+                    user=user,
+                    content=content,
+                    embedding=stub_embedding(content, dims),
+                    metadata={'source': f"benchmark-{blob.id}.txt", 'chunk_index': i, 'tokens': 80}
+                ))
+        DocumentChunk.objects.bulk_create(chunks, batch_size=500)
+
+    def _run(self, scenario, users, stub, total, concurrency, seed):
+        if total <= 0:
+            return None
+        counter = itertools.count()
+        latencies = []
+        statuses = Counter()
+        db_queries = []
+        db_ms = []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    i = next(counter)
+                    if i >= total:
+                        break
+                    rng = np.random.default_rng((*seed, i))
+                    user = users[rng.integers(len(users))]
+                    started = time.perf_counter()
+                    try:
+                        response = scenario(client, user, stub, rng, i)
+                        status = response.status_code
+                    except Exception as e:
+                        response = None
+                        status = type(e).__name__
+                    elapsed = (time.perf_counter() - started) * 1000
+                    timing = SERVER_TIMING_DB.search(response.get('Server-Timing', '')) if response else None
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[str(status)] += 1
+                        if timing:
+                            db_ms.append(float(timing.group(1)))
+                            db_queries.append(int(timing.group(2)))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - started
+
+        latencies = np.array(latencies)
+        result = {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+            'statuses': dict(statuses),
+            'throughput_rps': round(len(latencies) / wall_seconds, 2),
+            'mean_ms': round(float(latencies.mean()), 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+            'max_ms': round(float(latencies.max()), 2),
+        }
+        if db_queries:
+            # From the Server-Timing header of RequestMetricsMiddleware
+            result['db_queries_mean'] = round(float(np.mean(db_queries)), 2)
+            result['db_queries_max'] = int(np.max(db_queries))
+            result['db_ms_mean'] = round(float(np.mean(db_ms)), 2)
+        return result
+
+    def _endpoint(self, stub):
+        return {'endpoint_base_url': stub.base_url, 'endpoint_api_key': 'bench', 'endpoint_model': 'stub-chat'}
+
+    def _chat_completion(self, client, user, stub, rng, i):
+        return client.post(
+            '/api/chats/chat-completion/',
+            data=json.dumps({
+                'message': stub_text(rng.integers(2 ** 32), 20),
+                'conversation_id': int(rng.choice(user['conversations'])),
+                'use_context': True,
+                **self._endpoint(stub)
+            }),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=user['auth']
+        )
+
+    def _search_context(self, client, user, stub, rng, i):
+        return client.post(
+            '/api/chats/search-context/',
+            data=json.dumps({
+                'query': stub_text(rng.integers(2 ** 32), 12),
+                'conversation_id': int(rng.choice(user['conversations'])),
+                **self._endpoint(stub)
+            }),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=user['auth']
+        )
+
+    def _upload(self, client, user, stub, rng, i):
+        content = '\n\n'.join(stub_text(rng.integers(2 ** 32), 120) for _ in range(4))
+        return client.post(
+            '/api/chats/message-files/upload/',
+            data={
+                'message_id': int(rng.choice(user['user_messages'])),
+                'files': SimpleUploadedFile(f"upload-{i}.txt", content.encode('utf-8'), 'text/plain'),
+                'endpoint_base_url': stub.base_url,
+                'endpoint_api_key': 'bench',
+            },
+            HTTP_AUTHORIZATION=user['auth']
+        )
+
+    def _conversation_list(self, client, user, stub, rng, i):
+        return client.get('/api/chats/conversations/', HTTP_AUTHORIZATION=user['auth'])
+
+    def _fork(self, client, user, stub, rng, i):
+        conversation_id = int(rng.choice(user['conversations']))
+        return client.post(
+            f'/api/chats/conversations/{conversation_id}/fork/',
+            HTTP_AUTHORIZATION=user['auth']
+        )
@@ -0,0 +1,60 @@
+import time
+import uuid
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat.models import DocumentChunk, FileBlob
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row and bulk DocumentChunk insertion throughput (rows/sec)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dimensions', type=int, default=1536)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((rows, options['dimensions']), dtype=np.float32)
+
+        # Throwaway owner so every benchmark row is removed by one cascade
+        username = f"bench-{uuid.uuid4().hex[:12]}"
+        user = get_user_model().objects.create_user(username=username, email=f"{username}@example.invalid")
+        try:
+            per_row_blob = FileBlob.objects.create(user=user, sha256='per_row')
+            bulk_blob = FileBlob.objects.create(user=user, sha256='bulk')
+
+            def chunk(blob, i):
+                return DocumentChunk(
+                    blob=blob,
+                    user=user,
+                    content=f"chunk {i}",
+                    embedding=vectors[i],
+                    metadata={'source': blob.sha256, 'chunk_index': i}
+                )
+
+            # Before: one autocommitted INSERT per chunk
+            started = time.perf_counter()
+            for i in range(rows):
+                chunk(per_row_blob, i).save()
+            per_row_seconds = time.perf_counter() - started
+
+            # After: batched INSERTs inside one transaction for the file
+            started = time.perf_counter()
+            with transaction.atomic():
+                DocumentChunk.objects.bulk_create(
+                    [chunk(bulk_blob, i) for i in range(rows)],
+                    batch_size=options['batch_size']
+                )
+            bulk_seconds = time.perf_counter() - started
+        finally:
+            user.delete()
+
+        self.stdout.write(f"per-row create: {rows / per_row_seconds:10.1f} rows/sec ({per_row_seconds:.2f}s)")
+        self.stdout.write(f"bulk_create:    {rows / bulk_seconds:10.1f} rows/sec ({bulk_seconds:.2f}s)")
+        self.stdout.write(f"speedup:        {per_row_seconds / bulk_seconds:10.1f}x")
@@ -0,0 +1,79 @@
+import re
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chat.utils.chunker import get_chunker
+from chat.utils.context_window import token_counts
+from chat.utils.extractors import extract_text
+
+WORDS = (
+    "the index vector query embedding document user model search result chunk token "
+    "paragraph sentence latency memory database retrieval context answer request"
+).split()
+
+SENTENCE_END_RE = re.compile(r'[.!?][\'")\]]*$')
+
+
+def fixed_windows(pieces, size=1000, overlap=100):
+    """The previous chunking: fixed character windows with overlap"""
+    text = ''.join(pieces)
+    for i in range(0, len(text), size - overlap):
+        chunk = text[i:i + size]
+        if chunk:
+            yield i, chunk
+
+
+def synthetic_text(size, seed=0):
+    rng = np.random.default_rng(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.integers(2, 8)):
+            words = rng.choice(WORDS, size=rng.integers(5, 30))
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraphs.append(' '.join(sentences))
+        length += len(paragraphs[-1]) + 2
+    return '\n\n'.join(paragraphs)
+
+
+class Command(BaseCommand):
+    help = 'Compare fixed character windows with the configured chunker (speed, chunk count and shape)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Text, markdown or PDF file to chunk instead of synthetic text')
+        parser.add_argument('--size', type=int, default=5_000_000, help='Characters of synthetic text')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], 'rb') as f:
+                text = ''.join(extract_text(f, options['file']))
+        else:
+            text = synthetic_text(options['size'])
+        pieces = [text[i:i + 64 * 1024] for i in range(0, len(text), 64 * 1024)]
+        self.stdout.write(f"input: {len(text)} chars")
+
+        chunker = get_chunker()
+        strategies = [
+            ('fixed 1000/100 chars', fixed_windows),
+            (f'{type(chunker).__name__}', lambda p: ((offset, chunk) for offset, chunk, _ in chunker.chunks(p))),
+        ]
+        for name, chunk_fn in strategies:
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                chunks = [chunk for _, chunk in chunk_fn(pieces)]
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            tokens = token_counts(chunks)
+            mid_sentence = sum(1 for chunk in chunks if not SENTENCE_END_RE.search(chunk.rstrip()))
+            self.stdout.write(
+                f"{name:>24}: {len(chunks):7d} chunks, {len(text) / best / 1e6:7.2f} Mchars/sec, "
+                f"tokens/chunk mean {tokens.mean():6.1f} max {tokens.max():5d}, "
+                f"{mid_sentence / len(chunks):6.1%} end mid-sentence, "
+                f"{tokens.sum():9d} tokens embedded"
+            )
@@ -0,0 +1,130 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chat.utils.vector_search import search_setting
+
+TABLE = 'bench_vector_storage'
+
+
+def literal(vector):
+    return '[' + ','.join(f'{x:.6g}' for x in vector) + ']'
+
+
+class Command(BaseCommand):
+    help = 'Compare recall, latency and size of vector, halfvec, shortened and binary-quantized embedding storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--dimensions', type=int, default=search_setting('DIMENSIONS'))
+        parser.add_argument('--shortened', type=int, nargs='*', default=[768, 512],
+                            help='Also try vectors cut to these sizes (halfvec)')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--ef-search', type=int, default=search_setting('HNSW_EF_SEARCH'))
+        parser.add_argument('--rerank', type=int, default=search_setting('BINARY_RERANK'))
+
+    def handle(self, *args, **options):
+        dims = options['dimensions']
+        k = options['k']
+        data, queries = self._dataset(options['rows'], options['queries'], dims)
+        # Exact cosine neighbours on the full float32 vectors
+        truth = np.argsort(-(queries @ data.T), axis=1)[:, :k]
+
+        modes = [
+            ('vector', f'vector({dims})', 'v', 'vector_cosine_ops', '<=>', '{q}::vector({d})'),
+            ('halfvec', f'halfvec({dims})', f'v::halfvec({dims})', 'halfvec_cosine_ops', '<=>', '{q}::halfvec({d})'),
+        ]
+        for size in options['shortened']:
+            shorten = f'l2_normalize(subvector({{x}}, 1, {size}))::halfvec({size})'
+            modes.append((
+                f'halfvec {size}d', f'halfvec({size})', shorten.format(x='v'),
+                'halfvec_cosine_ops', '<=>', shorten.format(x='{q}::vector({d})')
+            ))
+        modes.append((
+            'binary + rerank', f'bit({dims})', f'binary_quantize(v)::bit({dims})',
+            'bit_hamming_ops', '<~>', f'binary_quantize({{q}}::vector({{d}}))::bit({dims})'
+        ))
+
+        with connection.cursor() as cursor:
+            try:
+                self._load(cursor, data, dims)
+                cursor.execute(f"SET hnsw.ef_search = {int(options['ef_search'])}")
+                baseline = None
+                for i, (name, column_type, value, opclass, operator, query_expr) in enumerate(modes):
+                    column = f'c{i}'
+                    cursor.execute(f"ALTER TABLE {TABLE} ADD COLUMN {column} {column_type}")
+                    cursor.execute(f"UPDATE {TABLE} SET {column} = {value}")
+                    started = time.perf_counter()
+                    cursor.execute(
+                        f"CREATE INDEX {TABLE}_{column}_idx ON {TABLE} USING hnsw ({column} {opclass}) "
+                        f"WITH (m = {int(search_setting('HNSW_M'))}, "
+                        f"ef_construction = {int(search_setting('HNSW_EF_CONSTRUCTION'))})"
+                    )
+                    build_seconds = time.perf_counter() - started
+                    cursor.execute(
+                        f"SELECT avg(pg_column_size({column})), pg_relation_size('{TABLE}_{column}_idx') FROM {TABLE}"
+                    )
+                    column_bytes, index_bytes = cursor.fetchone()
+
+                    expr = query_expr.format(q='%s', d=dims)
+                    sql = f"SELECT id FROM {TABLE} ORDER BY {column} {operator} {expr} LIMIT {k}"
+                    if operator == '<~>':
+                        sql = (
+                            f"SELECT id FROM (SELECT id, v FROM {TABLE} ORDER BY {column} <~> {expr} "
+                            f"LIMIT {k * options['rerank']}) shortlist "
+                            f"ORDER BY v <=> %s::vector({dims}) LIMIT {k}"
+                        )
+                    recall, latencies = self._run_queries(cursor, sql, queries, truth, operator == '<~>')
+
+                    if baseline is None:
+                        baseline = index_bytes
+                    self.stdout.write(
+                        f"{name:>16}: recall@{k} {recall:6.3f}  p50 {np.percentile(latencies, 50):7.2f}ms  "
+                        f"p95 {np.percentile(latencies, 95):7.2f}ms  column {float(column_bytes):7.0f} B/row  "
+                        f"index {index_bytes / 2 ** 20:8.1f} MiB ({baseline / index_bytes:4.1f}x smaller)  "
+                        f"build {build_seconds:6.1f}s"
+                    )
+                    cursor.execute(f"DROP INDEX {TABLE}_{column}_idx")
+                    cursor.execute(f"ALTER TABLE {TABLE} DROP COLUMN {column}")
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def _dataset(self, rows, queries, dims):
+        # Clustered unit vectors, closer to real embeddings than uniform noise
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((max(rows // 200, 1), dims), dtype=np.float32)
+        data = centers[rng.integers(len(centers), size=rows)]
+        data += 0.5 * rng.standard_normal((rows, dims), dtype=np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)
+        query_vectors = centers[rng.integers(len(centers), size=queries)]
+        query_vectors += 0.5 * rng.standard_normal((queries, dims), dtype=np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        return data, query_vectors
+
+    def _load(self, cursor, data, dims):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {TABLE} (id integer PRIMARY KEY, v vector({dims}))")
+        for start in range(0, len(data), 500):
+            batch = data[start:start + 500]
+            values = ', '.join(['(%s, %s::vector)'] * len(batch))
+            params = []
+            for offset, vector in enumerate(batch):
+                params.extend([start + offset, literal(vector)])
+            cursor.execute(f"INSERT INTO {TABLE} (id, v) VALUES {values}", params)
+        cursor.execute(f"ANALYZE {TABLE}")
+
+    def _run_queries(self, cursor, sql, queries, truth, rerank):
+        hits = 0
+        latencies = []
+        for query, expected in zip(queries, truth):
+            q = literal(query)
+            params = [q, q] if rerank else [q]
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            ids = [row[0] for row in cursor.fetchall()]
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(ids) & set(expected.tolist()))
+        return hits / truth.size, np.array(latencies)
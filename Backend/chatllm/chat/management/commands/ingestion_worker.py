@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from chat.utils.ingestion import claim_next_job, process_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the document ingestion worker that chunks and embeds uploaded files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of jobs processed concurrently')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue running jobs without a heartbeat for this many seconds')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        requeued = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale ingestion job(s)")
+
+        self.stdout.write(f"Ingestion worker started with {workers} worker(s)")
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._work, stop, options['poll_interval'], options['once'])
+                for _ in range(workers)
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping after current jobs...")
+                stop.set()
+
+    def _work(self, stop, poll_interval, once):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if once:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+
+                started = time.monotonic()
+                try:
+                    job = process_job(job)
+                except Exception as e:
+                    # One bad job must not take the worker thread with it
+                    self.stderr.write(f"Ingestion job {job.id} crashed: {str(e)}")
+                    continue
+                self.stdout.write(
+                    f"Job {job.id} {job.status}: {job.chunks_embedded}/{job.chunks_total} chunks ({job.chunks_failed} failed) "
+                    f"in {time.monotonic() - started:.1f}s"
+                )
+        finally:
+            connection.close()
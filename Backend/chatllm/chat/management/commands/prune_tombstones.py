@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from chat.utils.sync import prune_tombstones, sync_setting
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than the configured retention'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(
+            f"Deleted {deleted} tombstone(s) older than {sync_setting('TOMBSTONE_RETENTION_DAYS')} days"
+        )
@@ -0,0 +1,213 @@
+# chats/management/openai_stub.py
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+WORDS = (
+    "the model answers questions about documents using retrieved context and recent history "
+    "while the server stores messages files chunks embeddings and summaries for each user "
+    "latency throughput queries tokens cache index vector search rank fusion relevance"
+).split()
+
+
+def stub_embedding(text, dimensions):
+    """Unit vector seeded by the text, so equal texts always embed equally"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def stub_text(seed, words):
+    rng = np.random.default_rng(seed)
+    return ' '.join(WORDS[i] for i in rng.integers(len(WORDS), size=words))
+
+
+def _estimate_tokens(text):
+    return -(-len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like a real provider
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self.server.stub.count('models')
+            self._json({
+                'object': 'list',
+                'data': [
+                    {'id': model, 'object': 'model', 'created': 0, 'owned_by': 'stub'}
+                    for model in self.server.stub.models
+                ]
+            })
+        else:
+            self._json({'error': {'message': f'No route for GET {self.path}'}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._json({'error': {'message': 'Invalid JSON body'}}, status=400)
+            return
+
+        path = self.path.rstrip('/')
+        if path.endswith('/chat/completions'):
+            self._chat(body)
+        elif path.endswith('/embeddings'):
+            self._embeddings(body)
+        else:
+            self._json({'error': {'message': f'No route for POST {self.path}'}}, status=404)
+
+    def _chat(self, body):
+        stub = self.server.stub
+        stub.count('chat')
+        messages = body.get('messages') or []
+        last = messages[-1].get('content', '') if messages else ''
+        prompt_tokens = sum(_estimate_tokens(m.get('content') or '') for m in messages)
+        reply = stub_text(int.from_bytes(hashlib.sha256(last.encode('utf-8')).digest()[:8], 'little'), stub.reply_words)
+        completion_id = f'chatcmpl-stub-{hashlib.sha256(last.encode("utf-8")).hexdigest()[:12]}'
+
+        time.sleep(stub.chat_latency)
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage')
+            self._stream(completion_id, body.get('model'), reply, prompt_tokens if include_usage else None)
+            return
+        self._json({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(reply.split()),
+                'total_tokens': prompt_tokens + len(reply.split())
+            }
+        })
+
+    def _stream(self, completion_id, model, reply, prompt_tokens=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for word in reply.split():
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]
+            }
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            time.sleep(self.server.stub.token_latency)
+        if prompt_tokens is not None:
+            # Asked for with stream_options.include_usage: one last chunk without choices
+            usage = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': len(reply.split()),
+                    'total_tokens': prompt_tokens + len(reply.split())
+                }
+            }
+            self.wfile.write(f'data: {json.dumps(usage)}\n\n'.encode('utf-8'))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+    def _embeddings(self, body):
+        stub = self.server.stub
+        stub.count('embeddings')
+        texts = body.get('input') or []
+        if isinstance(texts, str):
+            texts = [texts]
+        dimensions = body.get('dimensions') or stub.dimensions
+        # The openai client asks for base64 unless told otherwise
+        as_base64 = body.get('encoding_format') == 'base64'
+
+        data = []
+        for index, text in enumerate(texts):
+            vector = stub_embedding(text, dimensions)
+            embedding = base64.b64encode(vector.tobytes()).decode('ascii') if as_base64 else vector.tolist()
+            data.append({'object': 'embedding', 'index': index, 'embedding': embedding})
+        tokens = sum(_estimate_tokens(text) for text in texts)
+
+        time.sleep(stub.embedding_latency)
+        self._json({
+            'object': 'list',
+            'data': data,
+            'model': body.get('model'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        })
+
+    def _json(self, payload, status=200):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StubOpenAIServer:
+    """OpenAI-compatible server on localhost with fixed latencies and seeded output
+
+    Serves chat completions (plain and streamed), embeddings and the model
+    list; used as a context manager it runs on a background thread.
+    """
+
+    def __init__(self, chat_latency=0.2, embedding_latency=0.05, token_latency=0.005,
+                 reply_words=60, dimensions=1536, models=('stub-chat', 'text-embedding-3-large'), port=0):
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.token_latency = token_latency
+        self.reply_words = reply_words
+        self.dimensions = dimensions
+        self.models = list(models)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}/v1'
+
+    def count(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
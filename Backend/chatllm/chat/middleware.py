@@ -0,0 +1,93 @@
+# chats/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .utils.metrics import RequestMetrics, activate, deactivate, metrics_setting
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.view_name:
+        return 'unmatched'
+    return match.view_name
+
+
+class RequestMetricsMiddleware:
+    """Record each request's SQL, upstream and retrieval time
+
+    Totals go to the metrics registry labelled by URL name and, unless
+    disabled, to a Server-Timing header. Streamed responses are recorded
+    when the last chunk has been sent; their header only covers the work
+    done before the first one. Runs natively in both sync and async
+    stacks, so ASGI requests are not moved onto a thread for it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics_setting('ENABLED'):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        try:
+            response = self.get_response(request)
+            return self._record(request, response, metrics)
+        finally:
+            deactivate(token)
+
+    async def __acall__(self, request):
+        if not metrics_setting('ENABLED'):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        try:
+            response = await self.get_response(request)
+            return self._record(request, response, metrics)
+        finally:
+            deactivate(token)
+
+    def _record(self, request, response, metrics):
+        if metrics_setting('SERVER_TIMING'):
+            response['Server-Timing'] = metrics.server_timing()
+
+        def finish():
+            metrics.finish(_endpoint(request), request.method, response.status_code)
+
+        if response.streaming:
+            response.streaming_content = self._finish_after(response, metrics, finish)
+        else:
+            finish()
+        return response
+
+    def _finish_after(self, response, metrics, finish):
+        # The body is produced after this middleware returns, so the wrapper
+        # puts the request's metrics back in place while it is consumed;
+        # once finished they are ignored, so there is nothing to reset
+        content = response.streaming_content
+        if response.is_async:
+            async def wrapper():
+                activate(metrics)
+                try:
+                    async for part in content:
+                        yield part
+                finally:
+                    finish()
+        else:
+            def wrapper():
+                activate(metrics)
+                try:
+                    for part in content:
+                        yield part
+                finally:
+                    finish()
+        return wrapper()
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 11:20
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Index builds run CONCURRENTLY so chunk writes are not blocked meanwhile
+    atomic = False
+
+    dependencies = [
+        ('chat', '0003_embeddingcache'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='doc_chunk_emb_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+        RemoveIndexConcurrently(
+            model_name='documentchunk',
+            name='document_chunk_embedding_idx',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 12:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_documentchunk_hnsw_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='conversation',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to='chat.conversation'),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE chat_documentchunk AS chunk
+                SET conversation_id = message.conversation_id,
+                    user_id = conversation.user_id
+                FROM chat_messagefile AS file
+                JOIN chat_message AS message ON message.id = file.message_id
+                JOIN chat_conversation AS conversation ON conversation.id = message.conversation_id
+                WHERE file.id = chunk.file_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
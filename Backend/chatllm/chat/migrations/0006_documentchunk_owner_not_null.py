@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-17 12:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from the backfill: PostgreSQL refuses ALTER TABLE while the
+    # UPDATE's deferred foreign key checks are still pending.
+
+    dependencies = [
+        ('chat', '0005_documentchunk_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to='chat.conversation'),
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
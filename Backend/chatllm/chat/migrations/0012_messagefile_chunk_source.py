@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-17 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagefile',
+            name='chunk_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunk_shares', to='chat.messagefile'),
+        ),
+    ]
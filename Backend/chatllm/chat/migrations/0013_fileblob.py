@@ -0,0 +1,94 @@
+# Generated by Django 5.1.6 on 2026-10-17 17:42
+
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import F
+
+
+def hash_stored_file(path):
+    digest = hashlib.sha256()
+    with default_storage.open(path) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def backfill_blobs(apps, schema_editor):
+    FileBlob = apps.get_model('chat', 'FileBlob')
+    MessageFile = apps.get_model('chat', 'MessageFile')
+    DocumentChunk = apps.get_model('chat', 'DocumentChunk')
+
+    # Ids ascending: a forked file comes after the file it shares chunks with
+    blob_of = {}
+    files = MessageFile.objects.select_related('message__conversation').order_by('id')
+    for file in files.iterator():
+        if file.chunk_source_id in blob_of:
+            blob_id = blob_of[file.chunk_source_id]
+        else:
+            try:
+                sha256 = hash_stored_file(file.file_path)
+            except Exception:
+                # Content we can't read can't be matched; it gets its own blob
+                sha256 = f'legacy-{file.id}'
+            blob, _ = FileBlob.objects.get_or_create(
+                user_id=file.message.conversation.user_id,
+                sha256=sha256,
+                defaults={'file_path': file.file_path, 'file_size': file.file_size}
+            )
+            blob_id = blob.id
+        blob_of[file.id] = blob_id
+
+        FileBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + 1)
+        MessageFile.objects.filter(pk=file.pk).update(blob_id=blob_id)
+
+        # Duplicate uploads and copied forks embedded the same content again
+        own_chunks = DocumentChunk.objects.filter(file_id=file.id)
+        if DocumentChunk.objects.filter(blob_id=blob_id).exists():
+            own_chunks.delete()
+        else:
+            own_chunks.update(blob_id=blob_id)
+
+    FileBlob.objects.filter(chunks__isnull=False).update(status='ready')
+    FileBlob.objects.exclude(status='ready').update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_messagefile_chunk_source'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('file_path', models.CharField(default='', max_length=255)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_blobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'sha256'), name='unique_blob_per_user_sha256')],
+            },
+        ),
+        migrations.AddField(
+            model_name='messagefile',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='files', to='chat.fileblob'),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chat.fileblob'),
+        ),
+        migrations.RunPython(backfill_blobs, migrations.RunPython.noop),
+    ]
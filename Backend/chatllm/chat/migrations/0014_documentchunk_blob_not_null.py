@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-17 17:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_fileblob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chat.fileblob'),
+        ),
+        migrations.RemoveIndex(
+            model_name='documentchunk',
+            name='chat_docume_file_id_9e922a_idx',
+        ),
+        migrations.RemoveField(
+            model_name='documentchunk',
+            name='file',
+        ),
+        migrations.RemoveField(
+            model_name='documentchunk',
+            name='conversation',
+        ),
+        migrations.RemoveField(
+            model_name='messagefile',
+            name='chunk_source',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-17 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_documentchunk_blob_not_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='chunks_failed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FailedChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField()),
+                ('metadata', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failed_chunks', to='chat.fileblob')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failed_chunks', to='chat.ingestionjob')),
+            ],
+        ),
+    ]
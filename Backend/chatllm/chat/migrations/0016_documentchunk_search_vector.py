@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-17 18:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The GIN index is built CONCURRENTLY; adding the stored column still
+    # rewrites the table once
+    atomic = False
+
+    dependencies = [
+        ('chat', '0015_failedchunk'),
+    ]
+
+    operations = [
+        # Spelled out so the column is exactly what hybrid_chunks queries
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE chat_documentchunk
+                        ADD COLUMN search_vector tsvector
+                        GENERATED ALWAYS AS (to_tsvector('english'::regconfig, COALESCE(content, ''))) STORED
+                    """,
+                    reverse_sql="ALTER TABLE chat_documentchunk DROP COLUMN search_vector",
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='documentchunk',
+                    name='search_vector',
+                    field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_chunk_search_gin_idx'),
+        ),
+    ]
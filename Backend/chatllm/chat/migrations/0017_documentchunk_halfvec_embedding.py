@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:40
+
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations
+
+from chat.utils.vector_search import AlterEmbeddingStorage
+
+
+class Migration(migrations.Migration):
+    # Converting the column rewrites the table; the index is dropped and
+    # rebuilt around it without holding a transaction open
+    atomic = False
+
+    dependencies = [
+        ('chat', '0016_documentchunk_search_vector'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='documentchunk',
+            name='doc_chunk_emb_hnsw_idx',
+        ),
+        AlterEmbeddingStorage(
+            model_name='documentchunk',
+            name='embedding',
+            field=pgvector.django.halfvec.HalfVectorField(dimensions=1536),
+        ),
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='doc_chunk_emb_hnsw_idx', opclasses=['halfvec_cosine_ops']),
+        ),
+    ]
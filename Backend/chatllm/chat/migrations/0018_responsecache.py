@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-17 20:15
+
+import django.utils.timezone
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0017_documentchunk_halfvec_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_hash', models.CharField(max_length=64)),
+                ('context_hash', models.CharField(max_length=64)),
+                ('query_embedding', pgvector.django.vector.VectorField(blank=True, null=True)),
+                ('response', models.TextField()),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'context_hash'], name='chat_respon_model_fb3b9a_idx'), models.Index(fields=['last_used_at'], name='chat_respon_last_us_fb96e1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model', 'prompt_hash'), name='unique_response_per_model_prompt')],
+            },
+        ),
+    ]
@@ -1,18 +1,28 @@
 # chats/models.py
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from pgvector.django import VectorField
-from pgvector.django import IvfflatIndex
+from .utils.vector_search import embedding_field, embedding_index, search_setting
 
 class Conversation(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Running summary of every message created up to summary_until
+    summary = models.TextField(blank=True, default='')
+    summary_until = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Sidebar listing: a user's conversations, most recent first
+            models.Index(fields=['user', '-updated_at', '-id']),
+        ]
 
 class Message(models.Model):
     ROLE_CHOICES = [
@@ -25,10 +35,19 @@ class Message(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     has_context = models.BooleanField(default=False)
+    # Prompt tokens of content, filled lazily by the context window builder
+    token_count = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # History pages and context windows walk a conversation by time
+            models.Index(fields=['conversation', 'created_at', 'id']),
+            # Incremental sync: messages changed since a watermark
+            models.Index(fields=['updated_at']),
+        ]
 
 class MessageVersion(models.Model):
     message = models.ForeignKey(Message, related_name='versions', on_delete=models.CASCADE)
@@ -38,8 +57,32 @@ class MessageVersion(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class FileBlob(models.Model):
+    """Uploaded content, stored and embedded once per user however often it is attached"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='file_blobs')
+    sha256 = models.CharField(max_length=64)
+    file_path = models.CharField(max_length=255, default='')
+    file_size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # MessageFiles pointing here; the blob, its chunks and its stored file
+    # are removed when the last one goes
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'sha256'], name='unique_blob_per_user_sha256')
+        ]
+
 class MessageFile(models.Model):
     message = models.ForeignKey(Message, related_name='files', on_delete=models.CASCADE)
+    blob = models.ForeignKey(FileBlob, related_name='files', null=True, blank=True, on_delete=models.RESTRICT)
     file_name = models.CharField(max_length=255, default='')
     file_path = models.CharField(max_length=255, default='')
     file_type = models.CharField(max_length=100, default='')
@@ -50,19 +93,125 @@ class MessageFile(models.Model):
         ordering = ['created_at']
 
 class DocumentChunk(models.Model):
-    file = models.ForeignKey('MessageFile', related_name='chunks', on_delete=models.CASCADE)
+    # Chunks belong to the content, shared by every file attaching it
+    blob = models.ForeignKey(FileBlob, related_name='chunks', on_delete=models.CASCADE)
+    # Denormalized from blob so user-wide searches stay on the chunk table
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='document_chunks', on_delete=models.CASCADE)
     content = models.TextField()
-    embedding = VectorField(dimensions=1536)  # For text-embedding-3-large
+    # text-embedding-3-large, stored as settings.VECTOR_SEARCH describes
+    embedding = embedding_field()
+    # Kept up to date by PostgreSQL for the full-text half of hybrid search
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config=search_setting('TEXT_SEARCH_CONFIG')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     metadata = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=['file']),
-            IvfflatIndex(
-                name='document_chunk_embedding_idx',  # Added name for the index
-                fields=['embedding'], 
-                lists=100,
-                opclasses=['vector_cosine_ops']
-            )
-        ]
\ No newline at end of file
+            GinIndex(fields=['search_vector'], name='document_chunk_search_gin_idx'),
+            # Index type and opclass follow settings.VECTOR_SEARCH so that
+            # queries ordered by the configured distance can use it
+            embedding_index('doc_chunk_emb'),
+        ]
+
+class IngestionJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    file = models.ForeignKey(MessageFile, related_name='ingestion_jobs', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Endpoint used for embeddings; the key is cleared once the job finishes
+    endpoint_base_url = models.CharField(max_length=255, blank=True, default='')
+    endpoint_api_key = models.CharField(max_length=255, blank=True, default='')
+    chunks_total = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+    chunks_failed = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the running worker; a stale one means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+class FailedChunk(models.Model):
+    """Chunk whose embedding failed, kept so the job can embed it again"""
+    job = models.ForeignKey(IngestionJob, related_name='failed_chunks', on_delete=models.CASCADE)
+    blob = models.ForeignKey(FileBlob, related_name='failed_chunks', on_delete=models.CASCADE)
+    content = models.TextField()
+    metadata = models.JSONField(default=dict)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class EmbeddingCache(models.Model):
+    # Content-addressed: identical text under the same model and endpoint
+    # is embedded once; model holds the key from endpoint_cache_key
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    embedding = VectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'text_hash'], name='unique_embedding_per_model_text')
+        ]
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+class ResponseCache(models.Model):
+    """Completion for a prompt, reused for the same or a near-identical question"""
+    model = models.CharField(max_length=100)
+    prompt_hash = models.CharField(max_length=64)
+    # Hash of everything in the prompt but the question, so near-identical
+    # questions are only matched against the same history and context
+    context_hash = models.CharField(max_length=64)
+    query_embedding = VectorField(null=True, blank=True)
+    response = models.TextField()
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'prompt_hash'], name='unique_response_per_model_prompt')
+        ]
+        indexes = [
+            models.Index(fields=['model', 'context_hash']),
+            models.Index(fields=['last_used_at']),
+        ]
+
+class Tombstone(models.Model):
+    """Record of a delete, so clients syncing since a watermark can drop it"""
+    OBJECT_CHOICES = [
+        ('conversation', 'Conversation'),
+        ('message', 'Message'),
+        # Every message of conversation_id created before deleted_at is gone
+        ('history', 'Conversation history'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tombstones')
+    object_type = models.CharField(max_length=20, choices=OBJECT_CHOICES)
+    object_id = models.BigIntegerField()
+    conversation_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
@@ -0,0 +1,18 @@
+# chats/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class ConversationCursorPagination(CursorPagination):
+    ordering = ('-updated_at', '-id')
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class MessageCursorPagination(CursorPagination):
+    # Newest first, so the first page is the latest turns; (created_at, id)
+    # keeps the cursor stable when timestamps collide
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
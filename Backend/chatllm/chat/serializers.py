@@ -1,11 +1,11 @@
 # chats/serializers.py
 from rest_framework import serializers
-from .models import Conversation, Message, MessageFile, MessageVersion
+from .models import Conversation, Message, MessageFile, MessageVersion, IngestionJob, Tombstone
 
 class MessageFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessageFile
-        fields = ['id', 'file', 'filename']
+        fields = ['id', 'file_name', 'file_path', 'file_type', 'file_size']
 
 class MessageSerializer(serializers.ModelSerializer):
     files = MessageFileSerializer(many=True, read_only=True)
@@ -22,6 +22,16 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'created_at', 'updated_at', 'messages']
 
 
+class ConversationListSerializer(serializers.ModelSerializer):
+    # Both come from annotations on the list queryset
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_preview = serializers.CharField(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = Conversation
+        fields = ['id', 'title', 'created_at', 'updated_at', 'message_count', 'last_message_preview']
+
+
 class MessageVersionSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessageVersion
@@ -38,4 +48,35 @@ class MessageFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessageFile
         fields = ['id', 'message', 'file_name', 'file_path', 'file_type', 'file_size', 'created_at']
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    file_name = serializers.CharField(source='file.file_name', read_only=True)
+
+    class Meta:
+        model = IngestionJob
+        fields = ['id', 'file', 'file_name', 'status', 'chunks_total', 'chunks_embedded',
+                  'chunks_failed', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+# Flat shapes for incremental sync: each row carries its parent id
+class SyncConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ['id', 'title', 'created_at', 'updated_at']
+
+class SyncMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'conversation', 'role', 'content', 'has_context', 'created_at', 'updated_at']
+
+class SyncMessageVersionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MessageVersion
+        fields = ['id', 'message', 'content', 'created_at']
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tombstone
+        fields = ['object_type', 'object_id', 'conversation_id', 'deleted_at']
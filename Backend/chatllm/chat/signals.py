@@ -0,0 +1,20 @@
+# chats/signals.py
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import MessageFile
+from .utils.blobs import release_blob
+from .utils.metrics import instrument_connection
+
+
+@receiver(post_delete, sender=MessageFile)
+def release_file_blob(sender, instance, **kwargs):
+    # Also runs for files removed by a message or conversation cascade
+    if instance.blob_id is not None:
+        release_blob(instance.blob_id)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
@@ -1,3 +1,162 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from chat.management.openai_stub import StubOpenAIServer, stub_text
+from chat.utils.chunker import BLOCK_CHARS, StructuredChunker
+from chat.utils.context_window import count_tokens
+from chat.utils.llm_gateway import leased_async_client, leased_client, reset_clients, standalone_client
+
+
+class LLMGatewayTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubOpenAIServer(chat_latency=0, embedding_latency=0, token_latency=0, reply_words=5, dimensions=8)
+        cls.stub.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+
+    def _chat(self, client):
+        return client.chat.completions.create(model='stub-chat', messages=[{'role': 'user', 'content': 'hello'}])
+
+    def test_client_is_shared_per_endpoint_and_key(self):
+        with leased_client(self.stub.base_url, 'key-a') as client:
+            with leased_client(self.stub.base_url, 'key-a') as same, \
+                    leased_client(self.stub.base_url, 'key-b') as other:
+                self.assertIs(same, client)
+                self.assertIsNot(other, client)
+
+            completion = self._chat(client)
+            self.assertEqual(len(completion.choices[0].message.content.split()), 5)
+            self.assertEqual([model.id for model in client.models.list().data], self.stub.models)
+
+    @override_settings(LLM_GATEWAY={'MAX_CLIENTS': 1})
+    def test_client_evicted_past_max_clients_is_closed(self):
+        with leased_client(self.stub.base_url, 'key-a') as first:
+            self._chat(first)
+        with leased_client(self.stub.base_url, 'key-b') as second:
+            self.assertTrue(first.is_closed())
+            self.assertFalse(second.is_closed())
+            self._chat(second)
+        with leased_client(self.stub.base_url, 'key-a') as client:
+            self.assertIsNot(client, first)
+
+    @override_settings(LLM_GATEWAY={'MAX_CLIENTS': 1})
+    def test_leased_client_is_closed_only_when_returned(self):
+        with leased_client(self.stub.base_url, 'key-a') as first:
+            with leased_client(self.stub.base_url, 'key-b'):
+                pass
+            self.assertFalse(first.is_closed())
+            self._chat(first)
+        self.assertTrue(first.is_closed())
+
+    @override_settings(LLM_GATEWAY={'IDLE_TIMEOUT': 0})
+    def test_idle_client_is_closed(self):
+        with leased_client(self.stub.base_url, 'key-a') as first:
+            with leased_client(self.stub.base_url, 'key-b'):
+                # Leased clients are never idle
+                self.assertFalse(first.is_closed())
+        with leased_client(self.stub.base_url, 'key-b'):
+            self.assertTrue(first.is_closed())
+
+    def test_standalone_client_stays_out_of_the_pool(self):
+        with leased_client(self.stub.base_url, 'key-a') as pooled:
+            with standalone_client(self.stub.base_url, 'key-a') as client:
+                self.assertIsNot(client, pooled)
+                self._chat(client)
+        self.assertTrue(client.is_closed())
+        self.assertFalse(pooled.is_closed())
+
+    @override_settings(LLM_GATEWAY={'MAX_CLIENTS': 1})
+    def test_async_client_evicted_past_max_clients_is_closed(self):
+        async def run():
+            with leased_async_client(self.stub.base_url, 'key-a') as first:
+                with leased_async_client(self.stub.base_url, 'key-a') as same:
+                    self.assertIs(same, first)
+                response = await first.embeddings.create(model='text-embedding-3-large', input=['hello'])
+                self.assertEqual(len(response.data[0].embedding), 8)
+
+            with leased_async_client(self.stub.base_url, 'key-b') as second:
+                # The close is scheduled on this loop
+                await asyncio.sleep(0.1)
+                self.assertTrue(first.is_closed())
+                self.assertFalse(second.is_closed())
+            await second.close()
+
+        asyncio.run(run())
+
+
+class StructuredChunkerTests(SimpleTestCase):
+    max_tokens = 100
+    overlap_tokens = 20
+
+    def _chunks(self, text, piece_size):
+        chunker = StructuredChunker(max_tokens=self.max_tokens, overlap_tokens=self.overlap_tokens)
+        pieces = (text[i:i + piece_size] for i in range(0, len(text), piece_size))
+        return list(chunker.chunks(pieces))
+
+    def _assert_covers(self, text, chunks):
+        self.assertTrue(chunks)
+        covered = 0
+        for offset, chunk, tokens in chunks:
+            # Offsets point at the chunk's text in the original
+            self.assertEqual(text[offset:offset + len(chunk)], chunk)
+            self.assertLessEqual(tokens, self.max_tokens)
+            # Chunks follow each other and only whitespace falls between them
+            self.assertFalse(text[covered:offset].strip(), f"Text lost before offset {offset}")
+            self.assertGreaterEqual(offset + len(chunk), covered)
+            covered = offset + len(chunk)
+        self.assertFalse(text[covered:].strip())
+
+    def test_offsets_and_coverage_across_blocks(self):
+        paragraphs = [
+            ' '.join(f"{stub_text((p, s), 6 + s % 9).capitalize()}." for s in range(1 + p % 7))
+            for p in range(1500)
+        ]
+        text = '\n\n'.join(paragraphs) + '\n'
+        self.assertGreater(len(text), 2 * BLOCK_CHARS)
+
+        chunks = self._chunks(text, 1000)
+        self._assert_covers(text, chunks)
+        # Consecutive chunks repeat some of the previous one's trailing text
+        overlapping = sum(
+            1 for (a, chunk, _), (b, _, _) in zip(chunks, chunks[1:]) if b < a + len(chunk)
+        )
+        self.assertGreater(overlapping, len(chunks) // 2)
+
+    def test_piece_boundaries_do_not_change_offsets(self):
+        text = '\n\n'.join(
+            ' '.join(f"{stub_text((p, s), 12)}." for s in range(5)) for p in range(400)
+        )
+        for piece_size in (7, 4096, len(text)):
+            self._assert_covers(text, self._chunks(text, piece_size))
+
+    def test_text_without_sentence_breaks(self):
+        text = stub_text(1, 40000)
+        self.assertGreater(len(text), 2 * BLOCK_CHARS)
+        self.assertNotIn('\n', text)
+        self._assert_covers(text, self._chunks(text, 1000))
+
+    def test_text_without_spaces(self):
+        text = 'abcdefghij' * 20000
+        self._assert_covers(text, self._chunks(text, 5000))
+
+    def test_token_cap(self):
+        text = '\n\n'.join(stub_text(p, 30 + p * 7) for p in range(80))
+        chunks = self._chunks(text, len(text))
+        self._assert_covers(text, chunks)
+        for _, chunk, tokens in chunks:
+            self.assertLessEqual(count_tokens(chunk), self.max_tokens + 2)
+        self.assertGreater(max(tokens for _, _, tokens in chunks), self.max_tokens // 2)
+
+    def test_blank_text_has_no_chunks(self):
+        self.assertEqual(self._chunks('', 10), [])
+        self.assertEqual(self._chunks(' \n\n\t ', 2), [])
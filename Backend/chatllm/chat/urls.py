@@ -4,7 +4,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 from .views import (
     ConversationViewSet, MessageViewSet, MessageVersionViewSet, 
-    MessageFileViewSet, chat_completion, search_context, fork_conversation, rename_conversation,fetch_models
+    MessageFileViewSet, IngestionJobViewSet, chat_completion, chat_completion_stream, search_context, sync_changes, fork_conversation, rename_conversation,fetch_models
 )
 
 # Main router
@@ -12,6 +12,7 @@ router = DefaultRouter()
 router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'messages', MessageViewSet, basename='message')
 router.register(r'message-files', MessageFileViewSet, basename='message-file')
+router.register(r'ingestion-jobs', IngestionJobViewSet, basename='ingestion-job')
 
 # Nested router for message versions
 message_router = routers.NestedSimpleRouter(router, r'messages', lookup='message')
@@ -21,7 +22,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include(message_router.urls)),  # Include the nested router URLs
     path('chat-completion/', chat_completion, name='chat-completion'),
+    path('chat-completion/stream/', chat_completion_stream, name='chat-completion-stream'),
     path('search-context/', search_context, name='search-context'),
+    path('sync/', sync_changes, name='sync-changes'),
     path('conversations/<int:conversation_id>/fork/', fork_conversation, name='fork-conversation'),
     path('conversations/<int:conversation_id>/rename/',rename_conversation, name='rename-conversation'),
     path('api/fetch-models/', fetch_models, name='fetch_models'),
@@ -0,0 +1,66 @@
+# chats/utils/blobs.py
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from ..models import FileBlob, MessageFile
+
+
+def hash_upload(upload):
+    """SHA-256 of an uploaded file, read in chunks and rewound afterwards"""
+    digest = hashlib.sha256()
+    for block in upload.chunks():
+        digest.update(block)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def attach_upload(message, upload):
+    """Create the MessageFile for upload, storing its content only if it is new
+
+    Returns the file and whether its blob still has to be ingested; content
+    the user already uploaded reuses the stored file and its chunks.
+    """
+    sha256 = hash_upload(upload)
+    user_id = message.conversation.user_id
+
+    with transaction.atomic():
+        blob, created = FileBlob.objects.select_for_update().get_or_create(
+            user_id=user_id,
+            sha256=sha256,
+            defaults={'file_size': upload.size}
+        )
+        if created:
+            blob.file_path = default_storage.save(f'blobs/{user_id}/{sha256}', upload)
+        # A failed blob is retried by the next upload of the same content
+        needs_ingestion = created or blob.status == 'failed'
+        if needs_ingestion:
+            blob.status = 'pending'
+        blob.ref_count = F('ref_count') + 1
+        blob.save(update_fields=['file_path', 'status', 'ref_count'])
+
+        file_record = MessageFile.objects.create(
+            message=message,
+            blob=blob,
+            file_name=upload.name,
+            file_path=blob.file_path,
+            file_type=upload.content_type,
+            file_size=upload.size
+        )
+    return file_record, needs_ingestion
+
+
+def release_blob(blob_id):
+    """Drop one reference; the last removes the blob, its chunks and stored file"""
+    FileBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+    blob = FileBlob.objects.filter(pk=blob_id, ref_count__lte=0).first()
+    if blob is None:
+        return False
+
+    file_path = blob.file_path
+    blob.delete()
+    if file_path:
+        transaction.on_commit(lambda: default_storage.delete(file_path))
+    return True
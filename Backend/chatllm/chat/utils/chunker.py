@@ -0,0 +1,160 @@
+# chats/utils/chunker.py
+import re
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .context_window import token_counts
+
+DEFAULTS = {
+    'CHUNKER': 'chat.utils.chunker.StructuredChunker',
+    'CHUNK_TOKENS': 400,
+    'OVERLAP_TOKENS': 50,
+}
+
+# A sentence (or line) and the whitespace after it; the text is the
+# concatenation of its segments, so offsets stay exact
+SEGMENT_RE = re.compile(r'[^\n]*?(?:[.!?][\'")\]]*[ \t]+|[ \t]*\n\s*|$)')
+# Text segmented and packed per block as it streams in
+BLOCK_CHARS = 64 * 1024
+
+
+def chunking_setting(name):
+    return getattr(settings, 'CHUNKING', {}).get(name, DEFAULTS[name])
+
+
+def get_chunker():
+    return import_string(chunking_setting('CHUNKER'))()
+
+
+def _is_paragraph_end(segment):
+    trailing = segment[len(segment.rstrip()):]
+    return trailing.count('\n') >= 2
+
+
+class StructuredChunker:
+    """Packs sentences into chunks of at most max_tokens, breaking on paragraphs where it can
+
+    Consecutive chunks repeat whole trailing sentences worth up to
+    overlap_tokens. Token counts are taken per block in one batch and chunk
+    boundaries come from searches over their cumulative sum.
+    """
+
+    def __init__(self, max_tokens=None, overlap_tokens=None):
+        self.max_tokens = max_tokens or chunking_setting('CHUNK_TOKENS')
+        self.overlap_tokens = chunking_setting('OVERLAP_TOKENS') if overlap_tokens is None else overlap_tokens
+
+    def chunks(self, pieces):
+        """(offset, text, tokens) of each chunk of text arriving in pieces"""
+        buffer = ''
+        offset = 0
+        segments = []
+        offsets = []
+        tokens = np.empty(0, dtype=np.int64)
+
+        for piece in pieces:
+            buffer += piece
+            if len(buffer) < BLOCK_CHARS:
+                continue
+            complete = self._segment(buffer)
+            carry = complete.pop()
+            if len(carry) > BLOCK_CHARS // 2:
+                # No sentence end in sight; cut here rather than buffer on
+                complete.append(carry)
+                carry = ''
+            tokens = np.concatenate([tokens, self._count(complete)])
+            offset = self._append(complete, offset, segments, offsets)
+            buffer = carry
+
+            bounds = self._pack(tokens, segments)
+            # The last chunk may still grow with the next block
+            for start, end in bounds[:-1]:
+                chunk = self._chunk(segments, offsets, tokens, start, end)
+                if chunk is not None:
+                    yield chunk
+            keep = bounds[-1][0] if bounds else len(segments)
+            del segments[:keep], offsets[:keep]
+            tokens = tokens[keep:]
+
+        complete = self._segment(buffer)
+        tokens = np.concatenate([tokens, self._count(complete)])
+        self._append(complete, offset, segments, offsets)
+        for start, end in self._pack(tokens, segments):
+            chunk = self._chunk(segments, offsets, tokens, start, end)
+            if chunk is not None:
+                yield chunk
+
+    def _segment(self, text):
+        segments = [m.group() for m in SEGMENT_RE.finditer(text) if m.group()]
+        return segments or ['']
+
+    def _append(self, new_segments, offset, segments, offsets):
+        for segment in new_segments:
+            segments.append(segment)
+            offsets.append(offset)
+            offset += len(segment)
+        return offset
+
+    def _count(self, segments):
+        # Segments longer than a chunk are split on spaces, in place
+        counts = token_counts(segments)
+        for _ in range(3):
+            oversized = np.flatnonzero(counts > self.max_tokens)
+            if not oversized.size:
+                break
+            for i in oversized[::-1]:
+                segments[i:i + 1] = self._split_long(segments[i], int(counts[i]))
+            counts = token_counts(segments)
+        return counts
+
+    def _split_long(self, text, tokens):
+        parts = -(-tokens // self.max_tokens)
+        size = max(-(-len(text) // parts), 1)
+        pieces = []
+        start = 0
+        while start < len(text):
+            end = min(start + size, len(text))
+            if end < len(text):
+                space = text.rfind(' ', start + size // 2, end)
+                if space != -1:
+                    end = space + 1
+            pieces.append(text[start:end])
+            start = end
+        return pieces
+
+    def _pack(self, tokens, segments):
+        """(start, end) segment ranges of each chunk"""
+        n = len(tokens)
+        if n == 0:
+            return []
+        cum = np.cumsum(tokens)
+        paragraph_ends = np.fromiter((_is_paragraph_end(s) for s in segments), dtype=bool, count=n)
+
+        bounds = []
+        start = 0
+        while start < n:
+            base = cum[start - 1] if start else 0
+            end = max(int(np.searchsorted(cum, base + self.max_tokens, side='right')), start + 1)
+            if end < n:
+                # End on a paragraph instead if the chunk is at least half full there
+                breaks = np.flatnonzero(
+                    paragraph_ends[start:end] & (cum[start:end] - base >= self.max_tokens // 2)
+                )
+                if breaks.size:
+                    end = start + int(breaks[-1]) + 1
+            bounds.append((start, end))
+            if end >= n:
+                break
+            # Smallest tail of whole segments worth no more than the overlap
+            back = int(np.searchsorted(cum, cum[end - 1] - self.overlap_tokens, side='left')) + 1
+            start = min(max(back, start + 1), end)
+        return bounds
+
+    def _chunk(self, segments, offsets, tokens, start, end):
+        text = ''.join(segments[start:end])
+        stripped = text.strip()
+        if not stripped:
+            return None
+        offset = offsets[start] + len(text) - len(text.lstrip())
+        return offset, stripped, int(tokens[start:end].sum())
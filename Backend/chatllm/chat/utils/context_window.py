@@ -0,0 +1,104 @@
+# chats/utils/context_window.py
+import numpy as np
+from django.conf import settings
+
+from ..models import Message
+
+try:
+    import tiktoken
+except ImportError:  # counts fall back to a characters-per-token estimate
+    tiktoken = None
+
+DEFAULTS = {
+    'TOKEN_BUDGET': 8000,       # prompt tokens sent per completion
+    'RESPONSE_RESERVE': 1024,   # kept free for the model's answer
+    'MESSAGE_OVERHEAD': 4,      # role/formatting tokens per chat message
+    'ENCODING': 'cl100k_base',
+    'CHARS_PER_TOKEN': 4,
+}
+
+_encoding = None
+
+
+def context_setting(name):
+    return getattr(settings, 'CHAT_CONTEXT', {}).get(name, DEFAULTS[name])
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(context_setting('ENCODING'))
+        except Exception as e:
+            print(f"Token encoding unavailable, estimating counts: {str(e)}")
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // context_setting('CHARS_PER_TOKEN'))
+
+
+def token_counts(texts):
+    """Token count of each text as an array, encoded in one batch"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        encoded = encoding.encode_ordinary_batch(list(texts))
+        return np.fromiter((len(tokens) for tokens in encoded), dtype=np.int64, count=len(encoded))
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    return -(-lengths // context_setting('CHARS_PER_TOKEN'))
+
+
+def message_tokens(message):
+    """Tokens a formatted {"role", "content"} message costs in the prompt"""
+    return count_tokens(message["content"]) + context_setting('MESSAGE_OVERHEAD')
+
+
+def recent_history(messages, budget):
+    """Newest messages of the queryset that fit in budget tokens, oldest first
+
+    Messages are read newest first and reading stops at the first one that
+    no longer fits, so long conversations are never loaded in full. Token
+    counts missing on Message rows are computed and saved on the way.
+    """
+    overhead = context_setting('MESSAGE_OVERHEAD')
+    selected = []
+    uncounted = []
+    used = 0
+
+    for msg in messages.order_by('-created_at', '-id').iterator(chunk_size=100):
+        if msg.token_count is None:
+            msg.token_count = count_tokens(msg.content)
+            uncounted.append(msg)
+        cost = msg.token_count + overhead
+        if used + cost > budget:
+            break
+        selected.append(msg)
+        used += cost
+
+    if uncounted:
+        Message.objects.bulk_update(uncounted, ['token_count'])
+
+    selected.reverse()
+    return selected
+
+
+def build_prompt(system_messages, history, new_message=None):
+    """System messages, as much recent history as fits, then the new turn"""
+    budget = context_setting('TOKEN_BUDGET') - context_setting('RESPONSE_RESERVE')
+    fixed = list(system_messages)
+    if new_message is not None:
+        fixed.append({"role": "user", "content": new_message})
+    budget -= sum(message_tokens(m) for m in fixed)
+
+    formatted_messages = list(system_messages)
+    formatted_messages.extend([
+        {"role": msg.role, "content": msg.content}
+        for msg in recent_history(history, max(budget, 0))
+    ])
+    if new_message is not None:
+        formatted_messages.append({"role": "user", "content": new_message})
+    return formatted_messages
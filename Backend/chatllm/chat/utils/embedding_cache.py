@@ -0,0 +1,239 @@
+# chats/utils/embedding_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import EmbeddingCache
+from .metrics import record_usage, registry, upstream
+from .vector_search import search_setting
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+DEFAULTS = {
+    'LRU_MAX_BYTES': 64 * 1024 * 1024,  # in-process cache, per worker
+    'MAX_ROWS': 500000,                 # rows kept in the embedding cache table
+    'PRUNE_EVERY': 1000,                # inserts between table size checks
+}
+
+
+def cache_setting(name):
+    return getattr(settings, 'EMBEDDING_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def request_params(model):
+    """Model and size for embeddings.create; text-embedding-3 shortens vectors on request"""
+    return {'model': model, 'dimensions': search_setting('DIMENSIONS')}
+
+
+def endpoint_cache_key(base_url, model=EMBEDDING_MODEL):
+    """Name cached rows are stored under for model served by base_url
+
+    Users choose the endpoint, so each one gets rows of its own: vectors
+    from one endpoint never answer lookups made through another. Vectors
+    shortened to different sizes must not share rows either.
+    """
+    endpoint = hashlib.sha256(str(base_url).rstrip('/').encode('utf-8')).hexdigest()[:16]
+    return f"{model}@{search_setting('DIMENSIONS')}@{endpoint}"
+
+
+def _cache_key(client, model):
+    return endpoint_cache_key(client.base_url, model)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingLRU:
+    """Byte-bounded LRU of (model, text hash) -> float32 embedding"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key, embedding):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.nbytes
+            self._entries[key] = embedding
+            self.size += embedding.nbytes
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_lru = EmbeddingLRU(cache_setting('LRU_MAX_BYTES'))
+_prune_lock = threading.Lock()
+_inserts_since_prune = 0
+
+# Hit rates and LRU occupancy are served at /metrics
+registry.gauge('chatllm_embedding_cache_lru_entries', lambda: len(_lru))
+registry.gauge('chatllm_embedding_cache_lru_bytes', lambda: _lru.size)
+
+
+def _count(**results):
+    for result, count in results.items():
+        if count:
+            registry.inc('chatllm_embedding_cache_lookups_total', {'result': result}, count)
+
+
+def _lookup(model, texts):
+    """Resolve what we can from the LRU, then the table; None marks a miss"""
+    hashes = [text_hash(text) for text in texts]
+    embeddings = [_lru.get((model, h)) for h in hashes]
+    lru_hits = sum(1 for e in embeddings if e is not None)
+
+    missing = {h for h, e in zip(hashes, embeddings) if e is None}
+    db_hits = 0
+    if missing:
+        rows = dict(
+            EmbeddingCache.objects.filter(model=model, text_hash__in=missing)
+            .values_list('text_hash', 'embedding')
+        )
+        if rows:
+            transaction.on_commit(lambda: _touch(model, list(rows)), robust=True)
+        for i, h in enumerate(hashes):
+            if embeddings[i] is None and h in rows:
+                embeddings[i] = np.asarray(rows[h], dtype=np.float32)
+                _lru.put((model, h), embeddings[i])
+                db_hits += 1
+
+    _count(lru_hit=lru_hits, db_hit=db_hits, miss=len(texts) - lru_hits - db_hits)
+    return hashes, embeddings
+
+
+def _touch(model, hashes):
+    EmbeddingCache.objects.filter(model=model, text_hash__in=hashes).update(last_used_at=timezone.now())
+
+
+def _write(model, stored):
+    global _inserts_since_prune
+    EmbeddingCache.objects.bulk_create(
+        [EmbeddingCache(model=model, text_hash=h, embedding=e) for h, e in stored.items()],
+        ignore_conflicts=True
+    )
+
+    with _prune_lock:
+        _inserts_since_prune += len(stored)
+        due = _inserts_since_prune >= cache_setting('PRUNE_EVERY')
+        if due:
+            _inserts_since_prune = 0
+    if due:
+        prune_embedding_cache()
+
+
+def _store(model, hashes, vectors):
+    """Cache freshly fetched vectors and return them keyed by text hash
+
+    Table writes wait for the caller's transaction to commit (ingestion
+    holds one per file), so concurrent workers embedding the same text
+    don't queue on each other's uncommitted rows, and pruning never runs
+    inside it. Outside a transaction they happen straight away.
+    """
+    stored = {}
+    for h, vector in zip(hashes, vectors):
+        stored[h] = np.asarray(vector, dtype=np.float32)
+        _lru.put((model, h), stored[h])
+    transaction.on_commit(lambda: _write(model, stored), robust=True)
+    return stored
+
+
+def _missing_texts(texts, hashes, embeddings):
+    # Each distinct text is embedded once even if it repeats within the call
+    pending = OrderedDict()
+    for text, h, embedding in zip(texts, hashes, embeddings):
+        if embedding is None:
+            pending.setdefault(h, text)
+    return pending
+
+
+def _fill(hashes, embeddings, fetched):
+    return [e if e is not None else fetched[h] for h, e in zip(hashes, embeddings)]
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL):
+    """Embeddings for texts, calling the provider only for uncached ones"""
+    key = _cache_key(client, model)
+    hashes, embeddings = _lookup(key, texts)
+    pending = _missing_texts(texts, hashes, embeddings)
+    fetched = {}
+    if pending:
+        with upstream('embedding'):
+            response = client.embeddings.create(input=list(pending.values()), **request_params(model))
+        record_usage('embedding', response.usage)
+        fetched = _store(key, list(pending), [item.embedding for item in response.data])
+    return _fill(hashes, embeddings, fetched)
+
+
+async def aembed_texts(client, texts, model=EMBEDDING_MODEL):
+    """embed_texts for an AsyncOpenAI client"""
+    key = _cache_key(client, model)
+    hashes, embeddings = await sync_to_async(_lookup)(key, texts)
+    pending = _missing_texts(texts, hashes, embeddings)
+    fetched = {}
+    if pending:
+        with upstream('embedding'):
+            response = await client.embeddings.create(input=list(pending.values()), **request_params(model))
+        record_usage('embedding', response.usage)
+        fetched = await sync_to_async(_store)(key, list(pending), [item.embedding for item in response.data])
+    return _fill(hashes, embeddings, fetched)
+
+
+def lookup_embeddings(client, texts, model=EMBEDDING_MODEL):
+    """Cached embeddings of texts (None where missing) for callers fetching the rest themselves
+
+    Returns the text hashes, the embeddings and the distinct uncached texts
+    keyed by hash; pass them to complete_embeddings with the fetched vectors.
+    """
+    hashes, embeddings = _lookup(_cache_key(client, model), texts)
+    return hashes, embeddings, _missing_texts(texts, hashes, embeddings)
+
+
+def complete_embeddings(client, hashes, embeddings, pending, vectors, model=EMBEDDING_MODEL):
+    fetched = _store(_cache_key(client, model), list(pending), vectors) if pending else {}
+    return _fill(hashes, embeddings, fetched)
+
+
+def embed_query(client, text, model=EMBEDDING_MODEL):
+    return embed_texts(client, [text], model=model)[0]
+
+
+async def aembed_query(client, text, model=EMBEDDING_MODEL):
+    return (await aembed_texts(client, [text], model=model))[0]
+
+
+def prune_embedding_cache(max_rows=None):
+    """Drop the least recently used rows beyond max_rows"""
+    max_rows = cache_setting('MAX_ROWS') if max_rows is None else max_rows
+    cutoff = list(
+        EmbeddingCache.objects.order_by('-last_used_at')
+        .values_list('last_used_at', flat=True)[max_rows:max_rows + 1]
+    )
+    if not cutoff:
+        return 0
+    deleted, _ = EmbeddingCache.objects.filter(last_used_at__lte=cutoff[0]).delete()
+    return deleted
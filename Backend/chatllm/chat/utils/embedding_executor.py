@@ -0,0 +1,150 @@
+# chats/utils/embedding_executor.py
+import random
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import openai
+from django.conf import settings
+
+from .embedding_cache import EMBEDDING_MODEL, complete_embeddings, lookup_embeddings, request_params
+from .metrics import record_usage, upstream
+
+DEFAULTS = {
+    'CONCURRENCY': 4,           # embeddings requests in flight per ingestion job
+    'BATCH_TOKENS': 100000,     # per request; OpenAI allows 300k
+    'BATCH_SIZE': 256,          # texts per request; OpenAI allows 2048
+    'MAX_RETRIES': 6,           # on 429, 5xx and connection errors
+    'BACKOFF': 1.0,             # first retry delay in seconds, doubled each time
+    'BACKOFF_MAX': 60.0,
+}
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+# How providers word a request that is only too large: too many tokens or inputs
+SIZE_ERROR_MARKERS = (
+    'context_length_exceeded', 'max_tokens_per_request', 'maximum context length', 'tokens per request',
+    'too many tokens', 'too many inputs', 'maximum input', 'inputs are allowed',
+)
+
+
+def executor_setting(name):
+    return getattr(settings, 'EMBEDDING_EXECUTOR', {}).get(name, DEFAULTS[name])
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _too_large(error):
+    if error.status_code == 413:
+        return True
+    if error.status_code != 400:
+        return False
+    text = f"{getattr(error, 'code', None) or ''} {error.message}".lower()
+    return any(marker in text for marker in SIZE_ERROR_MARKERS)
+
+
+class EmbeddingExecutor:
+    """Embeds DocumentChunks in token-sized batches with several requests in flight
+
+    Cache lookups and stores stay on the calling thread (and its database
+    connection); worker threads only talk to the provider. Results come back
+    in order, and no more than CONCURRENCY batches are pulled ahead, so the
+    chunk source is consumed only as fast as embeddings return.
+    """
+
+    def __init__(self, client, model=EMBEDDING_MODEL):
+        # Retries are handled here, with backoff sized for rate limits
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.concurrency = executor_setting('CONCURRENCY')
+        self.batch_tokens = executor_setting('BATCH_TOKENS')
+        self.batch_size = executor_setting('BATCH_SIZE')
+
+    def batches(self, chunks):
+        batch = []
+        tokens = 0
+        for chunk in chunks:
+            chunk_tokens = chunk.metadata.get('tokens', 0)
+            if batch and (tokens + chunk_tokens > self.batch_tokens or len(batch) >= self.batch_size):
+                yield batch
+                batch = []
+                tokens = 0
+            batch.append(chunk)
+            tokens += chunk_tokens
+        if batch:
+            yield batch
+
+    def run(self, chunks):
+        """(batch, error) per batch, in order; embeddings are set on the chunks of batches without error"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = deque()
+            for batch in self.batches(chunks):
+                in_flight.append(self._submit(pool, batch))
+                if len(in_flight) >= self.concurrency:
+                    yield self._result(*in_flight.popleft())
+            while in_flight:
+                yield self._result(*in_flight.popleft())
+
+    def _submit(self, pool, batch):
+        try:
+            hashes, embeddings, pending = lookup_embeddings(self.client, [c.content for c in batch], model=self.model)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return batch, None, future
+
+        if pending:
+            future = pool.submit(self._fetch, list(pending.values()))
+        else:
+            future = Future()
+            future.set_result([])
+        return batch, (hashes, embeddings, pending), future
+
+    def _result(self, batch, cached, future):
+        try:
+            vectors = future.result()
+            embeddings = complete_embeddings(self.client, *cached, vectors, model=self.model)
+        except Exception as e:
+            return batch, e
+        for chunk, embedding in zip(batch, embeddings):
+            chunk.embedding = embedding
+        return batch, None
+
+    def _fetch(self, texts):
+        try:
+            return self._request(texts)
+        except openai.APIStatusError as e:
+            # Other errors (unknown model, bad dimensions...) fail the same
+            # way at any size
+            if len(texts) == 1 or not _too_large(e):
+                raise
+            # Over a limit we don't know about: halve this batch and the
+            # size of later ones
+            half = len(texts) // 2
+            self.batch_size = max(1, min(self.batch_size, half))
+            return self._fetch(texts[:half]) + self._fetch(texts[half:])
+
+    def _request(self, texts):
+        max_retries = executor_setting('MAX_RETRIES')
+        for attempt in range(max_retries + 1):
+            try:
+                with upstream('embedding'):
+                    response = self.client.embeddings.create(input=texts, **request_params(self.model))
+                record_usage('embedding', response.usage)
+                return [item.embedding for item in response.data]
+            except RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(executor_setting('BACKOFF') * 2 ** attempt, executor_setting('BACKOFF_MAX'))
+                    delay *= random.uniform(0.5, 1.0)
+                time.sleep(delay)
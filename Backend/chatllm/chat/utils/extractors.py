@@ -0,0 +1,126 @@
+# chats/utils/extractors.py
+import codecs
+import os
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF uploads fail their ingestion job instead
+    PdfReader = None
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def _sniff_encoding(head):
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is fine
+        if e.start < len(head) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+def iter_text(f):
+    """Decoded text of a binary file, one block at a time"""
+    block = f.read(READ_BLOCK_SIZE)
+    decoder = codecs.getincrementaldecoder(_sniff_encoding(block))(errors='replace')
+    while block:
+        text = decoder.decode(block)
+        if text:
+            yield text
+        block = f.read(READ_BLOCK_SIZE)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _iter_lines(blocks):
+    pending = ''
+    for block in blocks:
+        pending += block
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        yield from lines
+        # A line longer than a block is passed on in pieces
+        if len(pending) > READ_BLOCK_SIZE:
+            yield pending
+            pending = ''
+    if pending:
+        yield pending
+
+
+def iter_markdown(f):
+    """Text of a markdown file, one heading section (at most about a block) at a time"""
+    section = []
+    size = 0
+    in_code = False
+    for line in _iter_lines(iter_text(f)):
+        if line.lstrip().startswith('```'):
+            in_code = not in_code
+        starts_section = not in_code and line.startswith('#')
+        if section and (starts_section or size >= READ_BLOCK_SIZE):
+            yield ''.join(section)
+            section = []
+            size = 0
+        section.append(line)
+        size += len(line)
+    if section:
+        yield ''.join(section)
+
+
+def iter_pdf(f):
+    """Text of a PDF, one page at a time"""
+    if PdfReader is None:
+        raise ValueError("PDF ingestion requires the pypdf package")
+    reader = PdfReader(f)
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        if text:
+            yield text + '\n\n'
+
+
+EXTRACTORS = {
+    'text': iter_text,
+    'markdown': iter_markdown,
+    'pdf': iter_pdf,
+}
+
+EXTENSIONS = {
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.pdf': 'pdf',
+}
+
+CONTENT_TYPES = {
+    'text/markdown': 'markdown',
+    'text/x-markdown': 'markdown',
+    'application/pdf': 'pdf',
+}
+
+
+def register_extractor(kind, extractor, extensions=(), content_types=()):
+    """Add or replace the extractor for a kind of file
+
+    extractor takes a binary file object and yields text pieces.
+    """
+    EXTRACTORS[kind] = extractor
+    EXTENSIONS.update({ext.lower(): kind for ext in extensions})
+    CONTENT_TYPES.update({content_type: kind for content_type in content_types})
+
+
+def extractor_kind(f, file_name='', content_type=''):
+    kind = CONTENT_TYPES.get(content_type) or EXTENSIONS.get(os.path.splitext(file_name)[1].lower())
+    if kind is None:
+        # Browsers send PDFs with a generic type now and then
+        kind = 'pdf' if f.read(5) == b'%PDF-' else 'text'
+        f.seek(0)
+    return kind
+
+
+def extract_text(f, file_name='', content_type=''):
+    """Text of an open binary file as a generator of pieces, picked by its type"""
+    return EXTRACTORS[extractor_kind(f, file_name, content_type)](f)
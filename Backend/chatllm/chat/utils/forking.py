@@ -0,0 +1,83 @@
+# chats/utils/forking.py
+from django.db import connection, transaction
+
+from ..models import Conversation, FileBlob, Message, MessageFile
+
+# One statement copies the messages and their files. Copied files point at
+# the same content blobs, so chunks are shared rather than duplicated and
+# only the blobs' reference counts change. New ids are drawn up front so
+# each copied file can be joined back to its copied message.
+FORK_SQL = """
+WITH src_messages AS (
+    SELECT id AS old_id, nextval(pg_get_serial_sequence('{message}', 'id')) AS new_id,
+           role, content, created_at, has_context, token_count
+    FROM {message}
+    WHERE conversation_id = %(source)s {until}
+), new_messages AS (
+    INSERT INTO {message} (id, conversation_id, role, content, created_at, updated_at, has_context, token_count)
+    SELECT new_id, %(target)s, role, content, created_at, now(), has_context, token_count
+    FROM src_messages
+), src_files AS (
+    SELECT m.new_id AS message_id, f.blob_id,
+           f.file_name, f.file_path, f.file_type, f.file_size, f.created_at
+    FROM {file} f
+    JOIN src_messages m ON f.message_id = m.old_id
+), new_files AS (
+    INSERT INTO {file} (message_id, blob_id, file_name, file_path, file_type, file_size, created_at)
+    SELECT message_id, blob_id, file_name, file_path, file_type, file_size, created_at
+    FROM src_files
+), shared_blobs AS (
+    UPDATE {blob} b
+    SET ref_count = b.ref_count + s.refs
+    FROM (
+        SELECT blob_id, count(*) AS refs FROM src_files
+        WHERE blob_id IS NOT NULL GROUP BY blob_id
+    ) s
+    WHERE b.id = s.blob_id
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM src_messages),
+       (SELECT count(*) FROM src_files),
+       (SELECT count(*) FROM shared_blobs)
+"""
+
+UNTIL_SQL = "AND (created_at, id) <= (%(until_created_at)s, %(until_id)s)"
+
+
+def copy_conversation(original, user, until_message=None):
+    """Copy original (up to and including until_message) into a new conversation
+
+    Returns the new conversation and the (messages, files, blobs shared) counts.
+    """
+    params = {'source': original.id}
+    until = ''
+    if until_message is not None:
+        until = UNTIL_SQL
+        params['until_created_at'] = until_message.created_at
+        params['until_id'] = until_message.id
+
+    # The running summary is only valid if the fork keeps everything it covers
+    keep_summary = original.summary_until is not None and (
+        until_message is None or original.summary_until <= until_message.created_at
+    )
+
+    with transaction.atomic():
+        new_conv = Conversation.objects.create(
+            user=user,
+            title=f"Fork of {original.title}",
+            summary=original.summary if keep_summary else '',
+            summary_until=original.summary_until if keep_summary else None
+        )
+        params['target'] = new_conv.id
+
+        sql = FORK_SQL.format(
+            message=Message._meta.db_table,
+            file=MessageFile._meta.db_table,
+            blob=FileBlob._meta.db_table,
+            until=until
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            counts = cursor.fetchone()
+
+    return new_conv, counts
@@ -0,0 +1,237 @@
+# chats/utils/ingestion.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import DocumentChunk, FailedChunk, FileBlob, IngestionJob, MessageFile
+from .chunker import get_chunker
+from .embedding_executor import EmbeddingExecutor
+from .extractors import extract_text
+from .llm_gateway import leased_client
+
+DEFAULTS = {
+    'BULK_INSERT_BATCH_SIZE': 500,  # DocumentChunk rows per INSERT
+    'HEARTBEAT_INTERVAL': 30,       # seconds between heartbeats of a running job
+}
+
+
+def ingestion_setting(name):
+    return getattr(settings, 'INGESTION', {}).get(name, DEFAULTS[name])
+
+
+def enqueue_file(file_record, endpoint_base_url, endpoint_api_key):
+    """Queue a stored MessageFile for chunking and embedding"""
+    return IngestionJob.objects.create(
+        file=file_record,
+        endpoint_base_url=endpoint_base_url or '',
+        endpoint_api_key=endpoint_api_key or ''
+    )
+
+
+def claim_next_job():
+    """Atomically mark the oldest pending job as running and return it"""
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = 'running'
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def requeue_stale_jobs(older_than):
+    """Put jobs back in the queue whose worker died mid-run
+
+    A job counts as dead once its heartbeat is older_than seconds old, so
+    older_than must comfortably exceed HEARTBEAT_INTERVAL.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return IngestionJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='running'
+    ).update(status='pending')
+
+
+def _close_connection():
+    connection.close()
+
+
+class ProgressReporter:
+    """Writes job progress and heartbeats from its own thread, and so its own connection
+
+    A file's chunks are inserted inside one transaction, so progress saved
+    on the worker's connection would stay invisible until the file is done.
+    Heartbeats go out every HEARTBEAT_INTERVAL even while no batch lands,
+    e.g. during upstream retries.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+
+    def report(self, **fields):
+        self._executor.submit(self._write, fields)
+
+    def _beat(self):
+        while not self._stopped.wait(ingestion_setting('HEARTBEAT_INTERVAL')):
+            self.report()
+
+    def _write(self, fields):
+        try:
+            IngestionJob.objects.filter(pk=self.job_id).update(heartbeat_at=timezone.now(), **fields)
+        except Exception as e:
+            print(f"Error reporting progress for ingestion job {self.job_id}: {str(e)}")
+
+    def close(self):
+        self._stopped.set()
+        self._heartbeat.join()
+        self._executor.submit(_close_connection)
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_job(job):
+    """Chunk and embed the job's file content, recording progress as batches land"""
+    try:
+        file_record = MessageFile.objects.select_related('blob').get(pk=job.file_id)
+        blob = file_record.blob
+        if blob.status == 'ready':
+            if job.failed_chunks.exists():
+                return _retry_failed_chunks(job, blob)
+            # Another upload of the same content was ingested meanwhile
+            job.chunks_total = job.chunks_embedded = blob.chunks.count()
+            return _finish(job, 'completed')
+
+        job.chunks_total = 0
+        job.chunks_embedded = 0
+        job.chunks_failed = 0
+        job.save(update_fields=['chunks_total', 'chunks_embedded', 'chunks_failed'])
+
+        def file_chunks(f):
+            pieces = extract_text(f, file_record.file_name, file_record.file_type)
+            for position, chunk, tokens in get_chunker().chunks(pieces):
+                yield DocumentChunk(
+                    blob=blob,
+                    user_id=blob.user_id,
+                    content=chunk,
+                    metadata={
+                        'source': file_record.file_name,
+                        'chunk_index': job.chunks_total,
+                        'position': position,
+                        'tokens': tokens
+                    }
+                )
+                job.chunks_total += 1
+
+        # The file is read, chunked, embedded and inserted as a stream, so
+        # memory use does not grow with its size. The job row must not be
+        # written on this connection until the transaction ends: the
+        # reporter thread updates it meanwhile.
+        with default_storage.open(blob.file_path, 'rb') as f, \
+                leased_client(job.endpoint_base_url or None, job.endpoint_api_key) as client, \
+                ProgressReporter(job.id) as progress, transaction.atomic():
+            if job.attempts > 1:
+                # A previous run died part way through; start the file over
+                blob.chunks.all().delete()
+                job.failed_chunks.all().delete()
+            _embed_chunks(job, blob, client, file_chunks(f), progress)
+            FileBlob.objects.filter(pk=blob.pk).update(status='ready')
+
+        job.status = 'completed'
+    except Exception as e:
+        print(f"Ingestion job {job.id} failed: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+        FileBlob.objects.filter(files__ingestion_jobs=job).update(status='failed')
+
+    return _finish(job, job.status)
+
+
+def _embed_chunks(job, blob, client, chunks, progress):
+    """Embed and insert chunks; batches that still fail after retries become FailedChunks"""
+    insert_batch_size = ingestion_setting('BULK_INSERT_BATCH_SIZE')
+    pending = []
+    failed = []
+    for batch, error in EmbeddingExecutor(client).run(chunks):
+        if error is None:
+            pending.extend(batch)
+            job.chunks_embedded += len(batch)
+        else:
+            print(f"Error embedding {len(batch)} chunks of ingestion job {job.id}: {str(error)}")
+            failed.extend(
+                FailedChunk(job=job, blob=blob, content=chunk.content, metadata=chunk.metadata, error=str(error))
+                for chunk in batch
+            )
+            job.chunks_failed += len(batch)
+
+        if len(pending) >= insert_batch_size:
+            DocumentChunk.objects.bulk_create(pending, batch_size=insert_batch_size)
+            pending = []
+        if len(failed) >= insert_batch_size:
+            FailedChunk.objects.bulk_create(failed, batch_size=insert_batch_size)
+            failed = []
+        progress.report(
+            chunks_total=job.chunks_total,
+            chunks_embedded=job.chunks_embedded,
+            chunks_failed=job.chunks_failed
+        )
+
+    if pending:
+        DocumentChunk.objects.bulk_create(pending, batch_size=insert_batch_size)
+    if failed:
+        FailedChunk.objects.bulk_create(failed, batch_size=insert_batch_size)
+
+
+def _retry_failed_chunks(job, blob):
+    """Embed only the chunks an earlier run of job could not"""
+    try:
+        retried = list(job.failed_chunks.values_list('id', flat=True))
+        chunks = (
+            DocumentChunk(blob=blob, user_id=blob.user_id, content=failed.content, metadata=failed.metadata)
+            for failed in job.failed_chunks.filter(id__in=retried).order_by('id').iterator()
+        )
+        job.chunks_failed = 0
+        with leased_client(job.endpoint_base_url or None, job.endpoint_api_key) as client, \
+                ProgressReporter(job.id) as progress, transaction.atomic():
+            _embed_chunks(job, blob, client, chunks, progress)
+            FailedChunk.objects.filter(id__in=retried).delete()
+        job.status = 'completed'
+    except Exception as e:
+        print(f"Retrying failed chunks of ingestion job {job.id} failed: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+
+    return _finish(job, job.status)
+
+
+def _finish(job, status):
+    job.status = status
+    job.endpoint_api_key = ''
+    job.finished_at = timezone.now()
+    fields = ['status', 'chunks_total', 'chunks_embedded', 'chunks_failed', 'error', 'endpoint_api_key', 'finished_at']
+    # The row is gone if the file was deleted meanwhile: nothing left to record
+    IngestionJob.objects.filter(pk=job.pk).update(**{field: getattr(job, field) for field in fields})
+    return job
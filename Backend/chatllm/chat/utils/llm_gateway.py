@@ -0,0 +1,212 @@
+# chats/utils/llm_gateway.py
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import httpx
+import openai
+from django.conf import settings
+
+DEFAULTS = {
+    'MAX_CLIENTS': 32,           # pooled clients kept per kind (sync / async)
+    'IDLE_TIMEOUT': 300,         # seconds before an unused client is closed
+    'TIMEOUT': 60.0,             # read/write timeout for embedding and model list calls
+    'COMPLETION_TIMEOUT': 600.0, # read/write timeout for chat completions
+    'CONNECT_TIMEOUT': 10.0,
+    'MAX_RETRIES': 2,
+    'MAX_CONNECTIONS': 100,
+    'MAX_KEEPALIVE_CONNECTIONS': 20,
+    'KEEPALIVE_EXPIRY': 30.0,
+}
+
+
+def gateway_setting(name):
+    return getattr(settings, 'LLM_GATEWAY', {}).get(name, DEFAULTS[name])
+
+
+def client_key(base_url, api_key):
+    """Pool key for an endpoint; the API key is only ever kept as a hash"""
+    digest = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+    return (base_url or '', digest)
+
+
+def _timeout():
+    return httpx.Timeout(gateway_setting('TIMEOUT'), connect=gateway_setting('CONNECT_TIMEOUT'))
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=gateway_setting('MAX_CONNECTIONS'),
+        max_keepalive_connections=gateway_setting('MAX_KEEPALIVE_CONNECTIONS'),
+        keepalive_expiry=gateway_setting('KEEPALIVE_EXPIRY'),
+    )
+
+
+class _ClientPool:
+    """LRU of live clients, leased out to callers
+
+    Clients pushed out past MAX_CLIENTS or IDLE_TIMEOUT are closed once their
+    last lease is returned; a leased client never counts as idle.
+    """
+
+    def __init__(self, build, close):
+        self._build = build
+        self._close = close
+        self._clients = OrderedDict()   # key -> [client, last used, leases, evicted]
+        self._lock = threading.Lock()
+
+    def _evict(self, key, closable):
+        entry = self._clients.pop(key)
+        entry[3] = True
+        if entry[2] == 0:
+            closable.append(entry[0])
+
+    def _acquire(self, key, base_url, api_key):
+        now = time.monotonic()
+        closable = []
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = [self._build(base_url, api_key), now, 0, False]
+            else:
+                self._clients.move_to_end(key)
+            entry[1] = now
+            entry[2] += 1
+
+            idle_timeout = gateway_setting('IDLE_TIMEOUT')
+            for other_key, (_, last_used, leases, _) in list(self._clients.items()):
+                if leases == 0 and now - last_used > idle_timeout:
+                    self._evict(other_key, closable)
+
+            while len(self._clients) > gateway_setting('MAX_CLIENTS'):
+                self._evict(next(iter(self._clients)), closable)
+
+        for client in closable:
+            self._close(client)
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry[1] = time.monotonic()
+            entry[2] -= 1
+            close = entry[3] and entry[2] == 0
+        if close:
+            self._close(entry[0])
+
+    @contextmanager
+    def lease(self, key, base_url, api_key):
+        entry = self._acquire(key, base_url, api_key)
+        try:
+            yield entry[0]
+        finally:
+            self._release(entry)
+
+    def clear(self):
+        closable = []
+        with self._lock:
+            for key in list(self._clients):
+                self._evict(key, closable)
+        for client in closable:
+            self._close(client)
+
+    def __len__(self):
+        return len(self._clients)
+
+
+def _build_sync_client(base_url, api_key):
+    return openai.OpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        timeout=_timeout(),
+        max_retries=gateway_setting('MAX_RETRIES'),
+        http_client=httpx.Client(timeout=_timeout(), limits=_limits()),
+    )
+
+
+def _close_sync_client(client):
+    try:
+        client.close()
+    except Exception as e:
+        print(f"Error closing LLM client: {str(e)}")
+
+
+def _build_async_client(base_url, api_key):
+    return openai.AsyncOpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        timeout=_timeout(),
+        max_retries=gateway_setting('MAX_RETRIES'),
+        http_client=httpx.AsyncClient(timeout=_timeout(), limits=_limits()),
+    )
+
+
+# Close tasks still running; the loop only keeps weak references to tasks
+_closing = set()
+
+
+def _close_async_client(client):
+    # Eviction runs on the loop that owns the client; without a running loop
+    # (reset_clients from sync code) the sockets are released on collection.
+    try:
+        task = asyncio.get_running_loop().create_task(client.close())
+    except RuntimeError:
+        return
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+_sync_clients = _ClientPool(_build_sync_client, _close_sync_client)
+
+# httpx.AsyncClient is bound to the loop it first ran on, so async clients are
+# pooled per event loop.
+_async_pools = weakref.WeakKeyDictionary()
+_async_pools_lock = threading.Lock()
+
+
+def leased_client(base_url, api_key):
+    """Shared keep-alive OpenAI client for this endpoint, leased for the with block"""
+    return _sync_clients.lease(client_key(base_url, api_key), base_url, api_key)
+
+
+def leased_async_client(base_url, api_key):
+    """Shared AsyncOpenAI client for this endpoint on the running event loop,
+    leased for the with block
+    """
+    loop = asyncio.get_running_loop()
+    with _async_pools_lock:
+        pool = _async_pools.get(loop)
+        if pool is None:
+            pool = _async_pools[loop] = _ClientPool(_build_async_client, _close_async_client)
+    return pool.lease(client_key(base_url, api_key), base_url, api_key)
+
+
+@contextmanager
+def standalone_client(base_url, api_key):
+    """OpenAI client of its own, closed after the with block
+
+    For callers that need no authentication, so that arbitrary endpoints and
+    keys cannot crowd the shared pool.
+    """
+    client = _build_sync_client(base_url, api_key)
+    try:
+        yield client
+    finally:
+        _close_sync_client(client)
+
+
+def completion_timeout():
+    """Timeout for chat completions, which may take minutes to generate"""
+    return httpx.Timeout(gateway_setting('COMPLETION_TIMEOUT'), connect=gateway_setting('CONNECT_TIMEOUT'))
+
+
+def reset_clients():
+    """Close every pooled client (tests, benchmarks, settings changes)"""
+    _sync_clients.clear()
+    with _async_pools_lock:
+        pools = list(_async_pools.values())
+    for pool in pools:
+        pool.clear()
@@ -0,0 +1,289 @@
+# chats/utils/metrics.py
+import contextvars
+import hmac
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    # Bearer token for /metrics; without one only ALLOWED_IPS may scrape.
+    # Both unset, nobody can: behind a reverse proxy every request comes
+    # from the proxy's address, so no address is trusted by default.
+    'TOKEN': None,
+    'ALLOWED_IPS': [],
+    'DURATION_BUCKETS': [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    'QUERY_BUCKETS': [1, 2, 5, 10, 20, 50, 100, 200, 500],
+}
+
+# Label for work done outside a request: ingestion, summaries
+BACKGROUND = 'background'
+
+METRICS = {
+    'chatllm_requests_total': ('counter', 'Requests by endpoint, method and status'),
+    'chatllm_request_duration_seconds': ('histogram', 'Time to the end of the response body'),
+    'chatllm_db_queries': ('histogram', 'SQL queries per request'),
+    'chatllm_db_query_seconds_total': ('counter', 'Time spent in SQL queries'),
+    'chatllm_upstream_calls_total': ('counter', 'LLM and embedding API calls'),
+    'chatllm_upstream_seconds_total': ('counter', 'Time spent waiting on LLM and embedding APIs'),
+    'chatllm_tokens_total': ('counter', 'Tokens billed by the LLM and embedding APIs'),
+    'chatllm_retrieval_seconds_total': ('counter', 'Time spent finding RAG context chunks'),
+    'chatllm_embedding_cache_lookups_total': ('counter', 'Embedding cache lookups by result: lru_hit, db_hit or miss'),
+    'chatllm_embedding_cache_lru_entries': ('gauge', 'Embeddings held in the in-process LRU'),
+    'chatllm_embedding_cache_lru_bytes': ('gauge', 'Bytes of embeddings held in the in-process LRU'),
+}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def metrics_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of this process, in Prometheus text format
+
+    Each worker process keeps its own numbers; scrape every worker, or run
+    one, to see them all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def gauge(self, name, read):
+        """Report read() as name's value at each scrape"""
+        with self._lock:
+            self._gauges[name] = read
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0
+                }
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self):
+        with self._lock:
+            gauges = list(self._gauges.items())
+        # Read outside the lock: readers may take locks of their own
+        gauge_values = [(name, read()) for name, read in gauges]
+
+        with self._lock:
+            series = defaultdict(list)
+            for name, value in gauge_values:
+                series[name].append(f'{name} {_format_value(value)}')
+            for (name, labels), value in sorted(self._counters.items()):
+                series[name].append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                for bound, count in zip(histogram['buckets'] + [math.inf], histogram['counts'] + [histogram['count']]):
+                    bucket_labels = labels + (('le', _format_value(bound)),)
+                    series[name].append(f'{name}_bucket{_format_labels(bucket_labels)} {count}')
+                series[name].append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram["sum"])}')
+                series[name].append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if name not in series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Database, upstream and retrieval time spent on behalf of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream = defaultdict(lambda: [0, 0.0])   # kind -> [calls, seconds]
+        self.tokens = defaultdict(int)                  # (kind, prompt|completion) -> tokens
+        self.retrieval_seconds = 0.0
+        self.finished = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"']
+        for kind, (calls, seconds) in self.upstream.items():
+            parts.append(f'{kind};dur={seconds * 1000:.1f};desc="{calls} calls"')
+        if self.retrieval_seconds:
+            parts.append(f'retrieval;dur={self.retrieval_seconds * 1000:.1f}')
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def flush(self, endpoint):
+        """Add upstream, token, retrieval and query time totals to the registry"""
+        for kind, (calls, seconds) in self.upstream.items():
+            registry.inc('chatllm_upstream_calls_total', {'endpoint': endpoint, 'kind': kind}, calls)
+            registry.inc('chatllm_upstream_seconds_total', {'endpoint': endpoint, 'kind': kind}, seconds)
+        for (kind, token_type), tokens in self.tokens.items():
+            registry.inc('chatllm_tokens_total', {'endpoint': endpoint, 'kind': kind, 'type': token_type}, tokens)
+        if self.retrieval_seconds:
+            registry.inc('chatllm_retrieval_seconds_total', {'endpoint': endpoint}, self.retrieval_seconds)
+        if self.db_queries:
+            registry.inc('chatllm_db_query_seconds_total', {'endpoint': endpoint}, self.db_seconds)
+
+    def finish(self, endpoint, method, status_code):
+        if self.finished:
+            return
+        self.finished = True
+        registry.inc('chatllm_requests_total', {'endpoint': endpoint, 'method': method, 'status': status_code})
+        registry.observe(
+            'chatllm_request_duration_seconds', {'endpoint': endpoint}, self.elapsed(),
+            metrics_setting('DURATION_BUCKETS')
+        )
+        registry.observe(
+            'chatllm_db_queries', {'endpoint': endpoint}, self.db_queries, metrics_setting('QUERY_BUCKETS')
+        )
+        self.flush(endpoint)
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    """RequestMetrics of the request being served, if any"""
+    metrics = _current.get()
+    if metrics is None or metrics.finished:
+        return None
+    return metrics
+
+
+def _record(update):
+    # Outside a request (worker threads, background jobs) numbers go straight
+    # to the registry under BACKGROUND
+    metrics = current_metrics()
+    if metrics is not None:
+        update(metrics)
+    elif metrics_setting('ENABLED'):
+        background = RequestMetrics()
+        update(background)
+        background.flush(BACKGROUND)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current_metrics()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+def instrument_connection(connection):
+    """Count the queries of every request that run on this database connection"""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _add_upstream(kind, seconds):
+    def update(metrics):
+        calls = metrics.upstream[kind]
+        calls[0] += 1
+        calls[1] += seconds
+    _record(update)
+
+
+@contextmanager
+def upstream(kind):
+    """Time the LLM ('llm') or embedding ('embedding') API call made in the block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_upstream(kind, time.perf_counter() - started)
+
+
+def record_usage(kind, usage):
+    """Add the token counts of an API response's usage"""
+    if usage is None:
+        return
+    counts = {
+        'prompt': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion': getattr(usage, 'completion_tokens', 0) or 0,
+    }
+
+    def update(metrics):
+        for token_type, tokens in counts.items():
+            if tokens:
+                metrics.tokens[(kind, token_type)] += tokens
+    _record(update)
+
+
+@contextmanager
+def retrieval():
+    """Time RAG context retrieval in the block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+
+        def update(metrics):
+            metrics.retrieval_seconds += seconds
+        _record(update)
+
+
+def scrape_allowed(request):
+    """Whether request may read /metrics: the bearer TOKEN if set, else ALLOWED_IPS"""
+    token = metrics_setting('TOKEN')
+    if token:
+        header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(header.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+    return request.META.get('REMOTE_ADDR') in metrics_setting('ALLOWED_IPS')
@@ -0,0 +1,92 @@
+# chats/utils/model_list.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .llm_gateway import client_key, standalone_client
+from .metrics import upstream
+
+DEFAULTS = {
+    'TTL': 300,             # seconds a model list is served without asking upstream
+    'STALE_TTL': 3600,      # then served while a background refresh runs, this much longer
+    'TIMEOUT': 15.0,        # upstream models.list timeout
+    'MAX_ENTRIES': 256,     # endpoints kept, least recently used dropped
+    'WORKERS': 2,           # background refreshes run at once
+}
+
+_entries = OrderedDict()    # client_key -> (model ids, fetched at)
+_in_flight = {}             # client_key -> Future of the running fetch
+_lock = threading.Lock()
+_executor = None
+
+
+def model_list_setting(name):
+    return getattr(settings, 'MODEL_LIST', {}).get(name, DEFAULTS[name])
+
+
+def _fetch(key, base_url, api_key, future):
+    try:
+        # fetch_models needs no login, so its clients stay out of the shared pool
+        with standalone_client(base_url, api_key) as client, upstream('models'):
+            client = client.with_options(max_retries=0, timeout=model_list_setting('TIMEOUT'))
+            models = tuple(model.id for model in client.models.list().data)
+    except Exception as e:
+        with _lock:
+            _in_flight.pop(key, None)
+        future.set_exception(e)
+        return
+
+    with _lock:
+        _entries[key] = (models, time.monotonic())
+        _entries.move_to_end(key)
+        while len(_entries) > model_list_setting('MAX_ENTRIES'):
+            _entries.popitem(last=False)
+        _in_flight.pop(key, None)
+    future.set_result(models)
+
+
+def _refresh(key, base_url, api_key, future):
+    _fetch(key, base_url, api_key, future)
+    if future.exception() is not None:
+        # The stale list keeps being served until STALE_TTL runs out
+        print(f"Error refreshing model list: {str(future.exception())}")
+
+
+def get_models(base_url, api_key, refresh=False):
+    """Model ids the endpoint offers, cached per endpoint and API key
+
+    Fresh lists are returned as is; stale ones too, with one background
+    refresh started. Otherwise, or with refresh, the caller waits for
+    upstream, sharing the call with concurrent lookups of the same
+    endpoint. Upstream errors are raised and not cached.
+    """
+    global _executor
+    key = client_key(base_url, api_key)
+    with _lock:
+        entry = _entries.get(key)
+        age = time.monotonic() - entry[1] if entry is not None else None
+        if entry is not None and not refresh and age < model_list_setting('TTL') + model_list_setting('STALE_TTL'):
+            _entries.move_to_end(key)
+            if age >= model_list_setting('TTL') and key not in _in_flight:
+                future = _in_flight[key] = Future()
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(max_workers=model_list_setting('WORKERS'))
+                _executor.submit(_refresh, key, base_url, api_key, future)
+            return list(entry[0])
+
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if leader:
+        _fetch(key, base_url, api_key, future)
+    return list(future.result())
+
+
+def clear_model_lists():
+    with _lock:
+        _entries.clear()
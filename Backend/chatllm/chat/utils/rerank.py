@@ -0,0 +1,79 @@
+# chats/utils/rerank.py
+import numpy as np
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CANDIDATES': 20,               # retrieved before diversifying down to the limit
+    'LAMBDA': 0.7,                  # 1.0 ranks by relevance only, 0.0 by novelty only
+    'MIN_RELEVANCE': None,          # drop candidates below this share of the best score
+    'DUPLICATE_SIMILARITY': 0.95,   # cosine similarity to a picked chunk that rules one out
+}
+
+
+def rerank_setting(name):
+    return getattr(settings, 'RERANK', {}).get(name, DEFAULTS[name])
+
+
+def _as_array(embedding):
+    # halfvec columns load as HalfVector, vector columns as numpy arrays
+    if hasattr(embedding, 'to_numpy'):
+        embedding = embedding.to_numpy()
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def mmr(embeddings, relevance, limit, lambda_, duplicate_similarity=None):
+    """Indices picked by maximal marginal relevance, in pick order
+
+    embeddings are the candidates' unit-length rows and relevance their
+    scores in [0, 1]. Each pick maximizes lambda_ * relevance minus
+    (1 - lambda_) * the highest similarity to anything already picked.
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    similarity = embeddings @ embeddings.T
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = []
+
+    while len(picked) < limit and available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        if duplicate_similarity is not None:
+            available &= max_similarity < duplicate_similarity
+    return picked
+
+
+def diversify(chunks, limit):
+    """Up to limit of the retrieved chunks, trading relevance for coverage
+
+    chunks come from hybrid_chunks, best first, with their fused score
+    and stored embedding.
+    """
+    if not rerank_setting('ENABLED') or len(chunks) <= 1:
+        return chunks[:limit]
+
+    relevance = np.array([chunk.score for chunk in chunks], dtype=np.float32)
+    relevance /= relevance.max()
+    min_relevance = rerank_setting('MIN_RELEVANCE')
+    if min_relevance is not None:
+        keep = np.flatnonzero(relevance >= min_relevance)
+        chunks = [chunks[i] for i in keep]
+        relevance = relevance[keep]
+
+    embeddings = np.stack([_as_array(chunk.embedding) for chunk in chunks])
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    picked = mmr(
+        embeddings,
+        relevance,
+        limit,
+        rerank_setting('LAMBDA'),
+        rerank_setting('DUPLICATE_SIMILARITY')
+    )
+    return [chunks[i] for i in picked]
@@ -0,0 +1,121 @@
+# chats/utils/response_cache.py
+import hashlib
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from pgvector.django import CosineDistance
+
+from ..models import ResponseCache
+from .vector_search import search_setting
+
+DEFAULTS = {
+    'ENABLED': False,
+    'TTL_SECONDS': 24 * 60 * 60,
+    # Cosine distance between question embeddings that still counts as the
+    # same question (same model, history and context); None: exact only
+    'SIMILARITY_THRESHOLD': 0.05,
+    'MAX_ROWS': 100000,             # least recently used rows beyond this are pruned
+    'PRUNE_EVERY': 1000,            # inserts between table size checks
+}
+
+_inserts_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+def response_cache_setting(name):
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+def _hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_keys(endpoint_base_url, messages, chunk_ids):
+    """(prompt hash, context hash) of a prompt whose last message is the question"""
+    context_hash = _hash({
+        'endpoint': endpoint_base_url or '',
+        'messages': messages[:-1],
+        'chunks': sorted(chunk_ids),
+        # Question embeddings of other sizes can't be compared
+        'dimensions': search_setting('DIMENSIONS'),
+    })
+    prompt_hash = _hash({
+        'context': context_hash,
+        'question': _normalize(messages[-1]['content']),
+    })
+    return prompt_hash, context_hash
+
+
+def lookup_response(model, prompt_hash, context_hash, query_embedding=None):
+    """Cached completion for the prompt or, given its embedding, a near-identical question"""
+    fresh = ResponseCache.objects.filter(
+        model=model,
+        created_at__gte=timezone.now() - timedelta(seconds=response_cache_setting('TTL_SECONDS'))
+    )
+    entry = fresh.filter(prompt_hash=prompt_hash).first()
+
+    threshold = response_cache_setting('SIMILARITY_THRESHOLD')
+    if entry is None and query_embedding is not None and threshold is not None:
+        entry = (
+            fresh.filter(context_hash=context_hash, query_embedding__isnull=False)
+            .annotate(distance=CosineDistance('query_embedding', query_embedding))
+            .filter(distance__lte=threshold)
+            .order_by('distance')
+            .first()
+        )
+    if entry is None:
+        return None
+
+    ResponseCache.objects.filter(pk=entry.pk).update(
+        last_used_at=timezone.now(),
+        hit_count=F('hit_count') + 1
+    )
+    return entry.response
+
+
+def store_response(model, prompt_hash, context_hash, response, query_embedding=None):
+    global _inserts_since_prune
+    now = timezone.now()
+    ResponseCache.objects.update_or_create(
+        model=model,
+        prompt_hash=prompt_hash,
+        defaults={
+            'context_hash': context_hash,
+            'query_embedding': query_embedding,
+            'response': response,
+            'created_at': now,
+            'last_used_at': now,
+        }
+    )
+
+    with _prune_lock:
+        _inserts_since_prune += 1
+        due = _inserts_since_prune >= response_cache_setting('PRUNE_EVERY')
+        if due:
+            _inserts_since_prune = 0
+    if due:
+        prune_response_cache()
+
+
+def prune_response_cache(max_rows=None):
+    """Drop expired rows and the least recently used beyond max_rows"""
+    max_rows = response_cache_setting('MAX_ROWS') if max_rows is None else max_rows
+    expired = timezone.now() - timedelta(seconds=response_cache_setting('TTL_SECONDS'))
+    deleted, _ = ResponseCache.objects.filter(created_at__lt=expired).delete()
+
+    cutoff = list(
+        ResponseCache.objects.order_by('-last_used_at')
+        .values_list('last_used_at', flat=True)[max_rows:max_rows + 1]
+    )
+    if cutoff:
+        evicted, _ = ResponseCache.objects.filter(last_used_at__lte=cutoff[0]).delete()
+        deleted += evicted
+    return deleted
@@ -0,0 +1,20 @@
+# chats/utils/retrieval.py
+from ..models import DocumentChunk, MessageFile
+
+
+def conversation_chunks(conversation_id):
+    """Chunks a conversation can retrieve from
+
+    Chunks hang off the content blob, so files of this conversation that
+    share content with other messages (or forks) find the same rows.
+    """
+    blobs = MessageFile.objects.filter(
+        message__conversation_id=conversation_id,
+        blob__isnull=False
+    ).values('blob')
+    return DocumentChunk.objects.filter(blob__in=blobs)
+
+
+def user_chunks(user):
+    # Blobs are never shared across users, so a blob's chunks are its owner's
+    return DocumentChunk.objects.filter(user=user)
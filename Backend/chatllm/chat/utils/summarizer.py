@@ -0,0 +1,153 @@
+# chats/utils/summarizer.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+
+from ..models import Conversation
+from .context_window import count_tokens
+from .llm_gateway import completion_timeout, leased_client
+from .metrics import record_usage, upstream
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TRIGGER_TOKENS': 4000,     # unsummarized history that triggers a refresh
+    'KEEP_RECENT_TOKENS': 2000, # newest history always left verbatim
+    'FOLD_MAX_TOKENS': 6000,    # history folded into the summary per refresh
+    'MAX_SUMMARY_TOKENS': 600,
+    'WORKERS': 2,
+}
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the existing summary with the new messages below. Keep facts, decisions, names, numbers and open questions; drop pleasantries.
+Reply with the updated summary only, in at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}"""
+
+_executor = None
+_in_flight = set()
+_lock = threading.Lock()
+
+
+def summary_setting(name):
+    return getattr(settings, 'CONVERSATION_SUMMARY', {}).get(name, DEFAULTS[name])
+
+
+def summarized_history(conversation, before=None):
+    """Summary system message(s) and the history not yet folded into it
+
+    before limits the history to messages created up to that time (regenerate);
+    a summary reaching past it is not used.
+    """
+    history = conversation.messages.all()
+    if before is not None:
+        history = history.filter(created_at__lte=before)
+
+    if not conversation.summary or conversation.summary_until is None:
+        return [], history
+    if before is not None and conversation.summary_until >= before:
+        return [], history
+
+    summary_message = {
+        "role": "system",
+        "content": f"Summary of the earlier conversation:\n{conversation.summary}"
+    }
+    return [summary_message], history.filter(created_at__gt=conversation.summary_until)
+
+
+def needs_refresh(conversation):
+    unsummarized = conversation.messages.all()
+    if conversation.summary_until is not None:
+        unsummarized = unsummarized.filter(created_at__gt=conversation.summary_until)
+    tokens = unsummarized.aggregate(total=Sum('token_count'))['total'] or 0
+    return tokens > summary_setting('TRIGGER_TOKENS')
+
+
+def schedule_summary_refresh(conversation, endpoint_base_url, endpoint_api_key, endpoint_model):
+    """Fold old turns into the summary in the background once history is long"""
+    global _executor
+    if not summary_setting('ENABLED') or not needs_refresh(conversation):
+        return False
+
+    with _lock:
+        if conversation.id in _in_flight:
+            return False
+        _in_flight.add(conversation.id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=summary_setting('WORKERS'))
+
+    _executor.submit(_refresh, conversation.id, endpoint_base_url, endpoint_api_key, endpoint_model)
+    return True
+
+
+def _refresh(conversation_id, endpoint_base_url, endpoint_api_key, endpoint_model):
+    try:
+        refresh_summary(conversation_id, endpoint_base_url, endpoint_api_key, endpoint_model)
+    except Exception as e:
+        print(f"Error refreshing summary of conversation {conversation_id}: {str(e)}")
+    finally:
+        with _lock:
+            _in_flight.discard(conversation_id)
+        connection.close()
+
+
+def _messages_to_fold(conversation):
+    # Oldest unsummarized messages, leaving the newest KEEP_RECENT_TOKENS alone
+    unsummarized = conversation.messages.all()
+    if conversation.summary_until is not None:
+        unsummarized = unsummarized.filter(created_at__gt=conversation.summary_until)
+    messages = list(unsummarized.order_by('created_at', 'id'))
+    for msg in messages:
+        if msg.token_count is None:
+            msg.token_count = count_tokens(msg.content)
+
+    keep = 0
+    while messages and keep + messages[-1].token_count <= summary_setting('KEEP_RECENT_TOKENS'):
+        keep += messages.pop().token_count
+
+    fold = []
+    folded_tokens = 0
+    for msg in messages:
+        if fold and folded_tokens + msg.token_count > summary_setting('FOLD_MAX_TOKENS'):
+            break
+        fold.append(msg)
+        folded_tokens += msg.token_count
+    return fold
+
+
+def refresh_summary(conversation_id, endpoint_base_url, endpoint_api_key, endpoint_model):
+    """Fold the next slice of old messages into the conversation's summary"""
+    conversation = Conversation.objects.get(pk=conversation_id)
+    fold = _messages_to_fold(conversation)
+    if not fold:
+        return False
+
+    prompt = SUMMARY_PROMPT.format(
+        max_words=int(summary_setting('MAX_SUMMARY_TOKENS') * 0.75),
+        summary=conversation.summary or "(none yet)",
+        messages="\n\n".join(f"{msg.role}: {msg.content}" for msg in fold)
+    )
+    with leased_client(endpoint_base_url, endpoint_api_key) as client, upstream('llm'):
+        response = client.chat.completions.create(
+            model=endpoint_model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=summary_setting('MAX_SUMMARY_TOKENS'),
+            timeout=completion_timeout()
+        )
+    record_usage('llm', response.usage)
+    summary = response.choices[0].message.content
+
+    # Only apply if nobody moved the summary (or cleared history) meanwhile
+    return bool(Conversation.objects.filter(
+        pk=conversation_id,
+        summary_until=conversation.summary_until
+    ).update(
+        summary=summary,
+        summary_until=fold[-1].created_at
+    ))
@@ -0,0 +1,61 @@
+# chats/utils/sync.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Conversation, Message, MessageVersion, Tombstone
+
+DEFAULTS = {
+    # Rows written this close to the watermark may still be committing, so
+    # they are sent again on the next sync; clients upsert by id
+    'SAFETY_WINDOW': 5,
+    # Tombstones older than this are pruned; older watermarks get a reset
+    'TOMBSTONE_RETENTION_DAYS': 30,
+}
+
+
+def sync_setting(name):
+    return getattr(settings, 'SYNC', {}).get(name, DEFAULTS[name])
+
+
+def record_message_deletes(user, messages):
+    Tombstone.objects.bulk_create([
+        Tombstone(user=user, object_type='message', object_id=msg.id, conversation_id=msg.conversation_id)
+        for msg in messages
+    ])
+
+
+def record_history_cleared(user, conversation):
+    Tombstone.objects.create(
+        user=user, object_type='history', object_id=conversation.id, conversation_id=conversation.id
+    )
+
+
+def record_conversation_delete(user, conversation):
+    Tombstone.objects.create(
+        user=user, object_type='conversation', object_id=conversation.id, conversation_id=conversation.id
+    )
+
+
+def retention_cutoff():
+    return timezone.now() - timedelta(days=sync_setting('TOMBSTONE_RETENTION_DAYS'))
+
+
+def prune_tombstones():
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=retention_cutoff()).delete()
+    return deleted
+
+
+def next_watermark():
+    return timezone.now() - timedelta(seconds=sync_setting('SAFETY_WINDOW'))
+
+
+def changes_since(user, since):
+    """Querysets of everything of user's that changed after since"""
+    return {
+        'conversations': Conversation.objects.filter(user=user, updated_at__gt=since),
+        'messages': Message.objects.filter(conversation__user=user, updated_at__gt=since),
+        'versions': MessageVersion.objects.filter(message__conversation__user=user, created_at__gt=since),
+        'tombstones': Tombstone.objects.filter(user=user, deleted_at__gt=since),
+    }
@@ -0,0 +1,261 @@
+# chats/utils/vector_search.py
+from django.conf import settings
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, migrations, transaction
+from django.db.models import F, Func, Value
+from django.db.models.functions import Cast
+from pgvector.django import (
+    BitField, CosineDistance, HalfVectorField, HammingDistance, HnswIndex, IvfflatIndex, L2Distance,
+    MaxInnerProduct, VectorField
+)
+from pgvector.utils import Vector
+
+DEFAULTS = {
+    # Storage of DocumentChunk.embedding; changing these needs a migration
+    # that converts the column (see AlterEmbeddingStorage)
+    'STORAGE': 'halfvec',       # 'vector' (float32) or 'halfvec' (float16)
+    'DIMENSIONS': 1536,         # asked of the embeddings API; text-embedding-3 shortens on request
+    # Index binary_quantize(embedding) instead, re-ranking the
+    # BINARY_RERANK x limit nearest by Hamming distance on the stored vectors
+    'BINARY_QUANTIZE': False,
+    'BINARY_RERANK': 4,
+    'METRIC': 'cosine',         # 'cosine', 'l2' or 'inner_product'
+    'INDEX': 'hnsw',            # 'hnsw' or 'ivfflat'
+    'HNSW_M': 16,
+    'HNSW_EF_CONSTRUCTION': 64,
+    'HNSW_EF_SEARCH': 40,
+    'IVFFLAT_LISTS': 100,
+    'IVFFLAT_PROBES': 10,
+    'MAX_DISTANCE': 0.5,        # cosine 0.5 == L2 1.0 on unit-length embeddings
+    # pgvector >= 0.8: keep scanning the HNSW graph until enough rows pass
+    # the WHERE clause ('relaxed_order' or 'strict_order'); None leaves it off
+    'HNSW_ITERATIVE_SCAN': None,
+    # Full-text side of hybrid search. The config is baked into the
+    # generated search_vector column by a migration.
+    'TEXT_SEARCH_CONFIG': 'english',
+    'HYBRID_CANDIDATES': 50,    # rows each ranker contributes before fusion
+    'RRF_K': 60,                # reciprocal rank fusion: 1 / (k + rank)
+}
+
+DISTANCES = {
+    'cosine': CosineDistance,
+    'l2': L2Distance,
+    'inner_product': MaxInnerProduct,
+}
+
+OPCLASSES = {
+    'vector': {
+        'cosine': 'vector_cosine_ops',
+        'l2': 'vector_l2_ops',
+        'inner_product': 'vector_ip_ops',
+    },
+    'halfvec': {
+        'cosine': 'halfvec_cosine_ops',
+        'l2': 'halfvec_l2_ops',
+        'inner_product': 'halfvec_ip_ops',
+    },
+}
+
+STORAGE_FIELDS = {
+    'vector': VectorField,
+    'halfvec': HalfVectorField,
+}
+
+
+def search_setting(name):
+    return getattr(settings, 'VECTOR_SEARCH', {}).get(name, DEFAULTS[name])
+
+
+def distance(field, vector):
+    """Distance expression for the configured metric; matches the index opclass"""
+    return DISTANCES[search_setting('METRIC')](field, vector)
+
+
+def embedding_field():
+    """Model field for embeddings in the configured storage"""
+    return STORAGE_FIELDS[search_setting('STORAGE')](dimensions=search_setting('DIMENSIONS'))
+
+
+def quantized(expression):
+    """binary_quantize(expression) as a bit string, one bit per dimension"""
+    return Cast(
+        Func(expression, function='binary_quantize', output_field=BitField()),
+        BitField(length=search_setting('DIMENSIONS'))
+    )
+
+
+def embedding_index(name_prefix, field='embedding'):
+    """ANN index over field built with the opclass of the configured storage and metric
+
+    Django caps index names at 30 characters, so name_prefix should stay
+    within 13 to leave room for the longest suffix, "_bit_ivfflat_idx".
+    """
+    if search_setting('INDEX') == 'hnsw':
+        index_class = HnswIndex
+        params = {'m': search_setting('HNSW_M'), 'ef_construction': search_setting('HNSW_EF_CONSTRUCTION')}
+    else:
+        index_class = IvfflatIndex
+        params = {'lists': search_setting('IVFFLAT_LISTS')}
+
+    if search_setting('BINARY_QUANTIZE'):
+        return index_class(
+            OpClass(quantized(F(field)), name='bit_hamming_ops'),
+            name=f'{name_prefix}_bit_{index_class.suffix}_idx',
+            **params
+        )
+    return index_class(
+        name=f'{name_prefix}_{index_class.suffix}_idx',
+        fields=[field],
+        opclasses=[OPCLASSES[search_setting('STORAGE')][search_setting('METRIC')]],
+        **params
+    )
+
+
+class AlterEmbeddingStorage(migrations.AlterField):
+    """AlterField for an embedding column that converts the stored vectors
+
+    Casts between vector and halfvec, and shortens vectors by truncating and
+    re-normalizing them, which is what text-embedding-3 returns when asked
+    for fewer dimensions. More dimensions need the chunks embedded again.
+    Indexes on the column must be dropped before and built again after.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._convert(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._convert(app_label, schema_editor, to_state, from_state)
+
+    def _convert(self, app_label, schema_editor, from_state, to_state):
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, to_model):
+            return
+        old_field = from_state.apps.get_model(app_label, self.model_name)._meta.get_field(self.name)
+        new_field = to_model._meta.get_field(self.name)
+        if new_field.dimensions > old_field.dimensions:
+            raise ValueError(
+                f"Cannot grow embeddings from {old_field.dimensions} to {new_field.dimensions} "
+                "dimensions; re-embed the chunks instead"
+            )
+
+        column = schema_editor.quote_name(new_field.column)
+        new_type = new_field.db_type(schema_editor.connection)
+        value = column
+        if new_field.dimensions < old_field.dimensions:
+            value = f"l2_normalize(subvector({column}::vector, 1, {new_field.dimensions}))"
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(to_model._meta.db_table)} "
+            f"ALTER COLUMN {column} TYPE {new_type} USING {value}::{new_type}"
+        )
+
+    def describe(self):
+        return f"Convert stored embeddings of {self.model_name}.{self.name}"
+
+
+def apply_search_params(limit=None):
+    """Set the ANN recall/speed knobs for the current transaction only
+
+    An HNSW scan returns at most ef_search rows, so it is raised to limit,
+    the most rows the query will take from the index (pgvector allows up to
+    1000). Filters are applied after the scan and can still leave fewer;
+    HNSW_ITERATIVE_SCAN keeps scanning until enough pass them.
+    """
+    with connection.cursor() as cursor:
+        if search_setting('INDEX') == 'hnsw':
+            ef_search = max(int(search_setting('HNSW_EF_SEARCH')), int(limit or 0))
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {min(ef_search, 1000)}")
+            iterative_scan = search_setting('HNSW_ITERATIVE_SCAN')
+            if iterative_scan in ('relaxed_order', 'strict_order'):
+                cursor.execute(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}")
+        else:
+            cursor.execute(f"SET LOCAL ivfflat.probes = {int(search_setting('IVFFLAT_PROBES'))}")
+
+
+def by_distance(queryset, query_embedding, limit):
+    """queryset annotated with distance, nearest first
+
+    With binary quantization only the limit x BINARY_RERANK rows nearest by
+    Hamming distance on the bit index are measured exactly.
+    """
+    if search_setting('BINARY_QUANTIZE'):
+        query_bits = quantized(Cast(
+            Value(Vector._to_db(query_embedding)),
+            VectorField(dimensions=search_setting('DIMENSIONS'))
+        ))
+        shortlist = (
+            queryset.order_by(HammingDistance(quantized(F('embedding')), query_bits))
+            .values('id')[:limit * search_setting('BINARY_RERANK')]
+        )
+        queryset = queryset.model.objects.filter(id__in=shortlist)
+    return queryset.annotate(
+        distance=distance('embedding', query_embedding)
+    ).order_by('distance')
+
+
+# Each ranker's candidates are numbered by rank and scored 1 / (k + rank);
+# a chunk found by both gets both scores. Vector candidates beyond
+# max_distance only count if the text search found them too.
+HYBRID_SQL = """
+WITH vector_hits AS ({vector_sql}),
+text_hits AS ({text_sql}),
+ranked AS (
+    SELECT id, 1.0 / (%s + row_number() OVER (ORDER BY distance)) AS score,
+           distance, NULL::float8 AS text_rank
+    FROM vector_hits
+    UNION ALL
+    SELECT id, 1.0 / (%s + row_number() OVER (ORDER BY text_rank DESC)) AS score,
+           NULL::float8 AS distance, text_rank
+    FROM text_hits
+), fused AS (
+    SELECT id, sum(score) AS score, min(distance) AS distance, max(text_rank) AS text_rank
+    FROM ranked
+    GROUP BY id
+    HAVING max(text_rank) IS NOT NULL OR %s::float8 IS NULL OR min(distance) <= %s::float8
+)
+SELECT chunk.*, fused.score, fused.distance, fused.text_rank
+FROM {table} chunk
+JOIN fused ON fused.id = chunk.id
+ORDER BY fused.score DESC, chunk.id
+LIMIT %s
+"""
+
+
+def hybrid_chunks(queryset, query_text, query_embedding, limit, max_distance=None):
+    """Top-k rows of queryset by reciprocal rank fusion of vector and full-text rank
+
+    One round trip: the nearest neighbours by embedding and the best
+    full-text matches are each ranked, then fused. Rows carry score,
+    distance (None for text-only hits) and text_rank (None for vector-only).
+    """
+    candidates = search_setting('HYBRID_CANDIDATES')
+    rrf_k = search_setting('RRF_K')
+    search_query = SearchQuery(query_text, config=search_setting('TEXT_SEARCH_CONFIG'), search_type='websearch')
+
+    vector_sql, vector_params = (
+        by_distance(queryset, query_embedding, candidates)
+        .values('id', 'distance')[:candidates]
+        .query.sql_with_params()
+    )
+    # Cover density with log length normalization, close to BM25's
+    # preference for dense matches in shorter chunks
+    text_sql, text_params = (
+        queryset.filter(search_vector=search_query)
+        .annotate(text_rank=SearchRank(F('search_vector'), search_query, cover_density=True, normalization=Value(1)))
+        .order_by('-text_rank')
+        .values('id', 'text_rank')[:candidates]
+        .query.sql_with_params()
+    )
+
+    sql = HYBRID_SQL.format(
+        vector_sql=vector_sql,
+        text_sql=text_sql,
+        table=queryset.model._meta.db_table
+    )
+    params = [*vector_params, *text_params, rrf_k, rrf_k, max_distance, max_distance, limit]
+
+    # The binary shortlist takes BINARY_RERANK times as many rows from the index
+    index_rows = candidates * (search_setting('BINARY_RERANK') if search_setting('BINARY_QUANTIZE') else 1)
+    with transaction.atomic():
+        apply_search_params(index_rows)
+        return list(queryset.model.objects.raw(sql, params))
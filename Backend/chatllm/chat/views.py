@@ -1,35 +1,92 @@
 # chat/views.py
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse, HttpResponseNotAllowed
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Conversation, Message, MessageFile, MessageVersion, DocumentChunk
-from .serializers import ConversationSerializer, MessageSerializer, MessageVersionSerializer, MessageFileSerializer
-import openai
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-from django.db import connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from asgiref.sync import sync_to_async
+from .models import Conversation, Message, MessageFile, MessageVersion, IngestionJob
+from .serializers import (
+    ConversationSerializer, ConversationListSerializer, MessageSerializer, MessageVersionSerializer,
+    MessageFileSerializer, IngestionJobSerializer, SyncConversationSerializer, SyncMessageSerializer,
+    SyncMessageVersionSerializer, TombstoneSerializer
+)
+from .pagination import ConversationCursorPagination, MessageCursorPagination
+from .utils.ingestion import enqueue_file
+from .utils.blobs import attach_upload
+from .utils.embedding_cache import embed_query, aembed_query
+from .utils.vector_search import hybrid_chunks, search_setting
+from .utils.rerank import diversify, rerank_setting
+from .utils.response_cache import cache_keys, lookup_response, response_cache_setting, store_response
+from .utils.context_window import build_prompt, count_tokens
+from .utils.retrieval import conversation_chunks, user_chunks
+from .utils.forking import copy_conversation
+from .utils.summarizer import summarized_history, schedule_summary_refresh
+from .utils.llm_gateway import completion_timeout, leased_async_client, leased_client
+from .utils.metrics import record_usage, registry, retrieval, scrape_allowed, upstream
+from .utils.model_list import get_models
+from .utils.sync import (
+    changes_since, next_watermark, record_conversation_delete, record_history_cleared,
+    record_message_deletes, retention_cutoff
+)
+from django.db import connection, transaction
 import os
 import json
+import asyncio
+import datetime
 import numpy as np
 from typing import List, Dict, Any
 from django.shortcuts import get_object_or_404
-from pgvector.django import L2Distance
-from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
+LAST_MESSAGE_PREVIEW_LENGTH = 120
+
 class ConversationViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ConversationCursorPagination
     
     def get_queryset(self):
-        return Conversation.objects.filter(user=self.request.user).order_by('-updated_at')
+        queryset = Conversation.objects.filter(user=self.request.user).order_by('-updated_at', '-id')
+        
+        if self.action == 'list':
+            # Sidebar rows: per-row subqueries, evaluated only for the page
+            conversation_messages = Message.objects.filter(conversation=OuterRef('pk')).order_by()
+            return queryset.annotate(
+                message_count=Coalesce(
+                    Subquery(conversation_messages.values('conversation').annotate(count=Count('id')).values('count')),
+                    0
+                ),
+                last_message_preview=Substr(
+                    Subquery(conversation_messages.order_by('-created_at', '-id').values('content')[:1]),
+                    1,
+                    LAST_MESSAGE_PREVIEW_LENGTH
+                )
+            )
+        if self.action == 'retrieve':
+            return queryset.prefetch_related('messages__files')
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ConversationListSerializer
+        return ConversationSerializer
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_conversation_delete(self.request.user, instance)
+            instance.delete()
+    
     @action(detail=True, methods=['post'])
     def add_message(self, request, pk=None):
         conversation = self.get_object()
@@ -41,10 +98,26 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        conversation = self.get_object()
+        queryset = conversation.messages.prefetch_related('versions')
+        
+        # Latest page first; follow "next" to scroll back through history
+        paginator = MessageCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = MessageSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['delete'])
     def clear_history(self, request, pk=None):
         conversation = self.get_object()
-        conversation.messages.all().delete()
+        with transaction.atomic():
+            conversation.messages.all().delete()
+            record_history_cleared(request.user, conversation)
+            conversation.summary = ''
+            conversation.summary_until = None
+            conversation.save(update_fields=['summary', 'summary_until', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -58,6 +131,10 @@ class MessageViewSet(viewsets.ModelViewSet):
         message = serializer.save()
         message.conversation.save(update_fields=['updated_at'])
     
+    def perform_update(self, serializer):
+        # Content may change, so the cached token count is recomputed on next use
+        serializer.save(token_count=None)
+    
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         
@@ -80,17 +157,21 @@ class MessageViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         conversation = instance.conversation
+        deleted = [instance]
         
-        # If this is a user message, also delete the next assistant message if it exists
-        if instance.role == 'user':
-            next_message = conversation.messages.filter(
-                created_at__gt=instance.created_at
-            ).first()
-            if next_message and next_message.role == 'assistant':
-                next_message.delete()
-        
-        self.perform_destroy(instance)
-        conversation.save(update_fields=['updated_at'])
+        with transaction.atomic():
+            # If this is a user message, also delete the next assistant message if it exists
+            if instance.role == 'user':
+                next_message = conversation.messages.filter(
+                    created_at__gt=instance.created_at
+                ).first()
+                if next_message and next_message.role == 'assistant':
+                    deleted.append(next_message)
+                    next_message.delete()
+            
+            record_message_deletes(request.user, deleted)
+            self.perform_destroy(instance)
+            conversation.save(update_fields=['updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     @action(detail=True, methods=['GET'])
@@ -105,18 +186,11 @@ class MessageViewSet(viewsets.ModelViewSet):
         message = self.get_object()
         conversation = message.conversation
         
-        # Get all messages up to this one
-        previous_messages = conversation.messages.filter(
-            created_at__lte=message.created_at
-        ).order_by('created_at')
-        
-        # Format messages for AI
-        formatted_messages = []
-        for msg in previous_messages:
-            formatted_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Get messages up to this one, as many as fit the token budget
+        summary_messages, previous_messages = summarized_history(
+            conversation, before=message.created_at
+        )
+        formatted_messages = build_prompt(summary_messages, previous_messages)
         
         # Get endpoint settings from request
         endpoint_base_url = request.data.get('endpoint_base_url')
@@ -124,22 +198,20 @@ class MessageViewSet(viewsets.ModelViewSet):
         endpoint_model = request.data.get('endpoint_model', 'gpt-4')
         
         try:
-            # Configure OpenAI client
-            client = openai.OpenAI(
-                base_url=endpoint_base_url,
-                api_key=endpoint_api_key
-            )
-            
             # Get new response
-            response = client.chat.completions.create(
-                model=endpoint_model,
-                messages=formatted_messages
-            )
+            with leased_client(endpoint_base_url, endpoint_api_key) as client, upstream('llm'):
+                response = client.chat.completions.create(
+                    model=endpoint_model,
+                    messages=formatted_messages,
+                    timeout=completion_timeout()
+                )
+            record_usage('llm', response.usage)
             
             new_content = response.choices[0].message.content
             
             # Update the message
             message.content = new_content
+            message.token_count = None
             message.save()
             
             return Response({
@@ -176,85 +248,127 @@ class MessageFileViewSet(viewsets.ModelViewSet):
         endpoint_api_key = request.data.get('endpoint_api_key')
         
         try:
-            message = Message.objects.get(id=message_id, conversation__user=request.user)
-            file_records = []
-            chunks_processed = 0
-            
-            client = openai.OpenAI(
-                base_url=endpoint_base_url,
-                api_key=endpoint_api_key
+            message = Message.objects.select_related('conversation').get(
+                id=message_id, conversation__user=request.user
             )
+            jobs = []
+            deduplicated = 0
             
             for file in files:
-                # Save file
-                path = default_storage.save(
-                    f'message_files/{message.id}/{file.name}',
-                    ContentFile(file.read())
-                )
-                
-                file_record = MessageFile.objects.create(
-                    message=message,
-                    file_name=file.name,
-                    file_path=path,
-                    file_type=file.content_type,
-                    file_size=file.size
-                )
-                
-                # Process file content
-                with default_storage.open(path) as f:
-                    text_content = f.read().decode('utf-8')
-                
-                # Create chunks with overlap
-                chunk_size = 1000
-                overlap = 100
-                text_chunks = []
-                for i in range(0, len(text_content), chunk_size - overlap):
-                    chunk = text_content[i:i + chunk_size]
-                    if chunk:
-                        text_chunks.append(chunk)
-                
-                # Batch process embeddings
-                batch_size = 10
-                for i in range(0, len(text_chunks), batch_size):
-                    batch = text_chunks[i:i + batch_size]
-                    try:
-                        # Get embeddings for batch
-                        embedding_response = client.embeddings.create(
-                            model="text-embedding-3-large",
-                            input=batch
-                        )
-                        
-                        # Create chunks with embeddings
-                        for j, (chunk, embedding_data) in enumerate(zip(batch, embedding_response.data)):
-                            DocumentChunk.objects.create(
-                                file=file_record,
-                                content=chunk,
-                                embedding=embedding_data.embedding,
-                                metadata={
-                                    'source': file.name,
-                                    'chunk_index': i + j,
-                                    'position': i + j * (chunk_size - overlap)
-                                }
-                            )
-                            chunks_processed += 1
-                            
-                    except Exception as e:
-                        print(f"Error processing batch {i//batch_size} of {file.name}: {str(e)}")
-                        continue
+                # Content is stored once per user; chunking and embedding
+                # happen in the ingestion worker, and only for new content
+                file_record, needs_ingestion = attach_upload(message, file)
+                if needs_ingestion:
+                    jobs.append(enqueue_file(file_record, endpoint_base_url, endpoint_api_key))
+                    continue
                 
-                file_records.append(file_record)
+                deduplicated += 1
+                # Same content still being ingested for an earlier upload
+                in_flight = IngestionJob.objects.filter(
+                    file__blob_id=file_record.blob_id,
+                    status__in=['pending', 'running']
+                ).first()
+                if in_flight is not None and in_flight not in jobs:
+                    jobs.append(in_flight)
             
             return Response({
-                "status": "success",
-                "files": len(file_records),
-                "chunks_processed": chunks_processed
-            })
+                "status": "queued",
+                "files": len(files),
+                "deduplicated": deduplicated,
+                "jobs": IngestionJobSerializer(jobs, many=True).data
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Message.DoesNotExist:
             return Response({"error": "Message not found"}, status=404)
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
+class IngestionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = IngestionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return IngestionJob.objects.filter(
+            file__message__conversation__user=self.request.user
+        ).select_related('file')
+    
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Queue a failed job, or the chunks a finished job could not embed, again"""
+        job = self.get_object()
+        if job.status in ('pending', 'running') or (job.status == 'completed' and not job.chunks_failed):
+            return Response({"error": "Nothing to retry"}, status=400)
+        
+        job.endpoint_base_url = request.data.get('endpoint_base_url') or ''
+        job.endpoint_api_key = request.data.get('endpoint_api_key') or ''
+        job.status = 'pending'
+        job.error = ''
+        job.save(update_fields=['endpoint_base_url', 'endpoint_api_key', 'status', 'error'])
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+CONTEXT_PROMPT_TEMPLATE = """Use the following relevant context to answer the user's question. this context is drived from a pdf given by the user:
+
+Context:
+{context}
+
+Answer the question based on the context above. If the context doesn't contain sufficient information, use your general knowledge but mention this fact."""
+
+
+def _find_relevant_chunks(conversation_id, query, query_embedding):
+    # Vector similarity and full-text rank, fused, then narrowed to five
+    # chunks that don't repeat one another
+    with retrieval():
+        candidates = hybrid_chunks(
+            conversation_chunks(conversation_id),
+            query,
+            query_embedding,
+            limit=rerank_setting('CANDIDATES'),
+            max_distance=search_setting('MAX_DISTANCE')
+        )
+        return diversify(candidates, limit=5)
+
+
+def _context_system_message(relevant_chunks):
+    if not relevant_chunks:
+        return {
+            "role": "system",
+            "content": "No relevant context found. Answering based on general knowledge."
+        }
+
+    context = "\n\n".join([
+        f"[Source: {chunk.metadata.get('source', 'Unknown')}, "
+        f"Relevance: {chunk.score:.4f}]\n{chunk.content}"
+        for chunk in relevant_chunks
+    ])
+    return {"role": "system", "content": CONTEXT_PROMPT_TEMPLATE.format(context=context)}
+
+
+CONTEXT_FAILED_MESSAGE = {
+    "role": "system",
+    "content": "Context retrieval failed. Answering based on general knowledge."
+}
+
+
+def _save_exchange(conversation, content, reply, used_context, user_message=None):
+    """Save the user turn (unless already saved) and the reply, touching the conversation once"""
+    turns = []
+    if user_message is None:
+        user_message = Message(
+            conversation=conversation, role='user', content=content, token_count=count_tokens(content)
+        )
+        turns.append(user_message)
+    assistant_message = Message(
+        conversation=conversation, role='assistant', content=reply,
+        has_context=used_context, token_count=count_tokens(reply)
+    )
+    turns.append(assistant_message)
+
+    with transaction.atomic():
+        Message.objects.bulk_create(turns)
+        conversation.save(update_fields=['updated_at'])
+    return user_message, assistant_message
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def chat_completion(request):
@@ -265,82 +379,84 @@ def chat_completion(request):
         endpoint_api_key = request.data.get('endpoint_api_key')
         endpoint_model = request.data.get('endpoint_model', 'gpt-4')
         use_context = request.data.get('use_context', False)
+        bypass_cache = request.data.get('bypass_cache', False)
+        # Set when the user turn was saved beforehand, e.g. to attach files to it
+        user_message_id = request.data.get('user_message_id')
 
         conversation = get_object_or_404(Conversation, id=conversation_id, user=request.user)
-        messages = conversation.messages.all()
-        formatted_messages = []
+        user_message = None
+        if user_message_id is not None:
+            user_message = get_object_or_404(
+                Message, id=user_message_id, conversation=conversation, role='user'
+            )
+            message = user_message.content
+        system_messages = []
+        used_context = False
+        relevant_chunks = []
+        query_embedding = None
+        context_failed = False
         
         if use_context:
             try:
-                client = openai.OpenAI(
-                    base_url=endpoint_base_url,
-                    api_key=endpoint_api_key
-                )
-
                 # Get query embedding
-                embedding_response = client.embeddings.create(
-                    model="text-embedding-3-large",
-                    input=message
-                )
-                query_embedding = embedding_response.data[0].embedding
-
-                # Vector similarity search using L2Distance
-                relevant_chunks = DocumentChunk.objects.annotate(
-                    distance=L2Distance('embedding', query_embedding)
-                ).filter(
-                    file__message__conversation_id=conversation_id,
-                    distance__lte=1.0  # Adjust threshold as needed
-                ).order_by('distance')[:5]
-
-                if relevant_chunks.exists():
-                    context = "\n\n".join([
-                        f"[Source: {chunk.metadata.get('source', 'Unknown')}, "
-                        f"Distance: {chunk.distance:.4f}]\n{chunk.content}"
-                        for chunk in relevant_chunks
-                    ])
-                    context_prompt = f"""Use the following relevant context to answer the user's question. this context is drived from a pdf given by the user:
+                with leased_client(endpoint_base_url, endpoint_api_key) as client:
+                    query_embedding = embed_query(client, message)
 
-Context:
-{context}
-
-Answer the question based on the context above. If the context doesn't contain sufficient information, use your general knowledge but mention this fact."""
-                    formatted_messages.append({"role": "system", "content": context_prompt})
-                else:
-                    formatted_messages.append({
-                        "role": "system", 
-                        "content": "No relevant context found. Answering based on general knowledge."
-                    })
+                relevant_chunks = _find_relevant_chunks(conversation_id, message, query_embedding)
+                used_context = bool(relevant_chunks)
+                system_messages.append(_context_system_message(relevant_chunks))
 
             except Exception as context_error:
                 print(f"Error during context retrieval: {str(context_error)}")
-                formatted_messages.append({
-                    "role": "system", 
-                    "content": "Context retrieval failed. Answering based on general knowledge."
-                })
+                system_messages.append(CONTEXT_FAILED_MESSAGE)
+                context_failed = True
 
-        # Add conversation history and new message
-        formatted_messages.extend([
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ])
-        formatted_messages.append({"role": "user", "content": message})
-
-        # Get completion
-        client = openai.OpenAI(
-            base_url=endpoint_base_url,
-            api_key=endpoint_api_key
-        )
-        
-        response = client.chat.completions.create(
-            model=endpoint_model,
-            messages=formatted_messages
+        # Add the running summary and as much recent history as the token
+        # budget allows, then the new message
+        summary_messages, history = summarized_history(conversation)
+        if user_message is not None:
+            history = history.exclude(id=user_message.id)
+        formatted_messages = build_prompt(system_messages + summary_messages, history, message)
+        schedule_summary_refresh(conversation, endpoint_base_url, endpoint_api_key, endpoint_model)
+
+        # Retrieved context enters the key as chunk ids, so a rephrased
+        # question pulling the same chunks can still match
+        use_cache = response_cache_setting('ENABLED') and not context_failed
+        if use_cache:
+            prompt_hash, context_hash = cache_keys(
+                endpoint_base_url,
+                formatted_messages[len(system_messages):],
+                [chunk.id for chunk in relevant_chunks]
+            )
+        ai_response = None
+        if use_cache and not bypass_cache:
+            ai_response = lookup_response(endpoint_model, prompt_hash, context_hash, query_embedding)
+        cached = ai_response is not None
+
+        if not cached:
+            # Get completion
+            with leased_client(endpoint_base_url, endpoint_api_key) as client, upstream('llm'):
+                response = client.chat.completions.create(
+                    model=endpoint_model,
+                    messages=formatted_messages,
+                    timeout=completion_timeout()
+                )
+            record_usage('llm', response.usage)
+            
+            ai_response = response.choices[0].message.content or ''
+            if use_cache and ai_response:
+                store_response(endpoint_model, prompt_hash, context_hash, ai_response, query_embedding)
+
+        user_message, assistant_message = _save_exchange(
+            conversation, message, ai_response, used_context, user_message
         )
-        
-        ai_response = response.choices[0].message.content
 
         return Response({
             "response": ai_response,
-            "used_context": use_context and relevant_chunks.exists()
+            "used_context": used_context,
+            "cached": cached,
+            "user_message_id": user_message.id,
+            "assistant_message_id": assistant_message.id
         })
 
     except Exception as e:
@@ -353,56 +469,227 @@ Answer the question based on the context above. If the context doesn't contain s
             status=500
         )
 
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _authenticate_token(request):
+    # Only header-based token auth is accepted here: the view is csrf_exempt,
+    # so session cookies must not be enough to drive it.
+    try:
+        result = await sync_to_async(TokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+@csrf_exempt
+async def chat_completion_stream(request):
+    """Stream the completion as server-sent events; run under chatllm.asgi."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    user = await _authenticate_token(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    message = data.get('message')
+    conversation_id = data.get('conversation_id')
+    endpoint_base_url = data.get('endpoint_base_url')
+    endpoint_api_key = data.get('endpoint_api_key')
+    endpoint_model = data.get('endpoint_model', 'gpt-4')
+    use_context = data.get('use_context', False)
+    # Set when the user turn was saved beforehand, e.g. to attach files to it
+    user_message_id = data.get('user_message_id')
+
+    conversation = await Conversation.objects.filter(id=conversation_id, user=user).afirst()
+    if conversation is None:
+        return JsonResponse({"error": "Conversation not found"}, status=404)
+
+    user_message = None
+    if user_message_id is not None:
+        user_message = await Message.objects.filter(
+            id=user_message_id, conversation=conversation, role='user'
+        ).afirst()
+        if user_message is None:
+            return JsonResponse({"error": "Message not found"}, status=404)
+        message = user_message.content
+
+    system_messages = []
+    used_context = False
+
+    if use_context:
+        try:
+            with leased_async_client(endpoint_base_url, endpoint_api_key) as client:
+                query_embedding = await aembed_query(client, message)
+
+            relevant_chunks = await sync_to_async(_find_relevant_chunks)(conversation.id, message, query_embedding)
+            used_context = bool(relevant_chunks)
+            system_messages.append(_context_system_message(relevant_chunks))
+        except Exception as context_error:
+            print(f"Error during context retrieval: {str(context_error)}")
+            system_messages.append(CONTEXT_FAILED_MESSAGE)
+
+    summary_messages, history = summarized_history(conversation)
+    if user_message is not None:
+        history = history.exclude(id=user_message.id)
+    formatted_messages = await sync_to_async(build_prompt)(
+        system_messages + summary_messages, history, message
+    )
+    await sync_to_async(schedule_summary_refresh)(
+        conversation, endpoint_base_url, endpoint_api_key, endpoint_model
+    )
+
+    async def save(parts):
+        # Shielded: a client disconnect cancels the response task mid-save
+        return await asyncio.shield(sync_to_async(_save_exchange)(
+            conversation, message, ''.join(parts), used_context, user_message
+        ))
+
+    async def event_stream():
+        parts = []
+        usage = None
+        # Leaving before the stream ends or fails means the client went away
+        disconnected = True
+        try:
+            try:
+                # Timed to the last token; the lease keeps the client open meanwhile
+                with leased_async_client(endpoint_base_url, endpoint_api_key) as client, upstream('llm'):
+                    stream = await client.chat.completions.create(
+                        model=endpoint_model,
+                        messages=formatted_messages,
+                        stream=True,
+                        # The last chunk then carries the token counts
+                        stream_options={"include_usage": True},
+                        timeout=completion_timeout()
+                    )
+                    async for chunk in stream:
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield _sse_event('delta', {"content": delta})
+            except Exception as e:
+                disconnected = False
+                print(f"Error in chat completion stream: {str(e)}")
+                yield _sse_event('error', {
+                    "error": "Failed to get response from AI service",
+                    "details": str(e)
+                })
+                return
+
+            # Save both turns once the whole answer has arrived
+            disconnected = False
+            saved_user_message, assistant_message = await save(parts)
+
+            yield _sse_event('done', {
+                "message_id": assistant_message.id,
+                "user_message_id": saved_user_message.id,
+                "used_context": used_context
+            })
+        finally:
+            record_usage('llm', usage)
+            if disconnected:
+                # Keep the user's turn and as much of the answer as was sent
+                await save(parts)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def search_context(request):
     try:
         query = request.data.get('query')
         n_results = request.data.get('n_results', 5)
-        max_distance = request.data.get('max_distance', 1.0)  # Threshold for L2 distance
+        max_distance = request.data.get('max_distance', search_setting('MAX_DISTANCE'))
+        conversation_id = request.data.get('conversation_id')
         endpoint_base_url = request.data.get('endpoint_base_url')
         endpoint_api_key = request.data.get('endpoint_api_key')
         
         if not query:
             return Response({"error": "No query provided"}, status=400)
         
-        client = openai.OpenAI(
-            base_url=endpoint_base_url,
-            api_key=endpoint_api_key
-        )
-        
         # Get embedding for query
-        embedding_response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=query
-        )
-        query_embedding = embedding_response.data[0].embedding
+        with leased_client(endpoint_base_url, endpoint_api_key) as client:
+            query_embedding = embed_query(client, query)
         
-        # Vector search with L2Distance
-        results = DocumentChunk.objects.annotate(
-            distance=L2Distance('embedding', query_embedding)
-        ).filter(
-            distance__lte=max_distance
-        ).order_by('distance')[:n_results]
+        # Only the caller's documents, optionally a single conversation's
+        chunks = user_chunks(request.user)
+        if conversation_id:
+            chunks = chunks & conversation_chunks(conversation_id)
+        
+        # Vector similarity and full-text rank, fused
+        with retrieval():
+            results = hybrid_chunks(
+                chunks,
+                query,
+                query_embedding,
+                limit=n_results,
+                max_distance=max_distance
+            )
         
         return Response({
             "results": [
                 {
                     "text": chunk.content,
                     "metadata": chunk.metadata,
-                    "distance": float(chunk.distance),
+                    "distance": float(chunk.distance) if chunk.distance is not None else None,
+                    "score": float(chunk.score),
                     "source": chunk.metadata.get('source', 'Unknown'),
                     "chunk_index": chunk.metadata.get('chunk_index', 0)
                 }
                 for chunk in results
             ],
-            "total_results": results.count()
+            "total_results": len(results)
         })
     except Exception as e:
         print(f"Search context error: {str(e)}")
         return Response({"error": str(e)}, status=500)
     
     
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    since_param = request.query_params.get('since')
+    try:
+        since = parse_datetime(since_param) if since_param else None
+    except ValueError:
+        since = None
+    if since_param and since is None:
+        return Response({"error": "since must be an ISO 8601 timestamp"}, status=400)
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since, datetime.timezone.utc)
+    
+    watermark = next_watermark()
+    
+    # No watermark, or one older than the tombstones we keep: the client
+    # has to reload everything before it can apply deltas again
+    if since is None or since < retention_cutoff():
+        return Response({"watermark": watermark, "reset": True})
+    
+    changes = changes_since(request.user, since)
+    return Response({
+        "watermark": watermark,
+        "reset": False,
+        "conversations": SyncConversationSerializer(changes['conversations'], many=True).data,
+        "messages": SyncMessageSerializer(changes['messages'], many=True).data,
+        "versions": SyncMessageVersionSerializer(changes['versions'], many=True).data,
+        "tombstones": TombstoneSerializer(changes['tombstones'], many=True).data,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def fork_conversation(request, conversation_id):
@@ -414,23 +701,21 @@ def fork_conversation(request, conversation_id):
             user=request.user
         )
         
-        # Create new conversation
-        new_conv = Conversation.objects.create(
-            user=request.user,
-            title=f"Fork of {original_conv.title}"
-        )
+        # Optionally fork at a given message instead of the latest one
+        until_message = None
+        message_id = request.data.get('message_id')
+        if message_id:
+            until_message = get_object_or_404(Message, id=message_id, conversation=original_conv)
         
-        # Copy messages
-        for message in original_conv.messages.all():
-            Message.objects.create(
-                conversation=new_conv,
-                role=message.role,
-                content=message.content
-            )
+        new_conv, _ = copy_conversation(original_conv, request.user, until_message=until_message)
         
-        serializer = ConversationSerializer(new_conv)
+        serializer = ConversationSerializer(
+            Conversation.objects.prefetch_related('messages__files').get(pk=new_conv.pk)
+        )
         return Response(serializer.data)
     
+    except Http404:
+        raise
     except Exception as e:
         return Response(
             {"error": str(e)},
@@ -465,9 +750,7 @@ def rename_conversation(request, conversation_id):
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-    
 
-from openai import OpenAI
 
 @csrf_exempt
 @require_POST
@@ -477,6 +760,7 @@ def fetch_models(request):
         data = json.loads(request.body)
         api_url = data.get('baseUrl')
         api_key = data.get('apiKey')
+        refresh = data.get('refresh', False)
         
         # Validate inputs
         if not api_url or not api_key:
@@ -485,19 +769,8 @@ def fetch_models(request):
                 'error': 'API URL and API key are required'
             }, status=400)
         
-        # Create OpenAI client with the provided API URL and key
-        client = OpenAI(
-            api_key=api_key,
-            base_url=api_url,
-            max_retries=0,
-            timeout=100
-        )
-        
-        # Fetch models using the client
-        model_list = client.models.list()
-        
-        # Extract model IDs
-        model_ids = [model.id for model in model_list.data]
+        # Cached per API URL and key; refresh skips the cache
+        model_ids = get_models(api_url, api_key, refresh=refresh)
         
         return JsonResponse({
             'success': True,
@@ -508,4 +781,11 @@ def fetch_models(request):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+def prometheus_metrics(request):
+    """Request, query, upstream and token counters of this process for Prometheus"""
+    if not scrape_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -3,6 +3,11 @@ ASGI config for chatllm project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with uvicorn (in requirements.txt) so that streamed chat
+completions run on the event loop instead of holding a thread each:
+
+    uvicorn chatllm.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
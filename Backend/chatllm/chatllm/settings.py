@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the timings cover the whole middleware stack
+    'chat.middleware.RequestMetricsMiddleware',
      'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -118,6 +120,134 @@ DATABASES = {
 
 CHROMA_DB_DIR = os.path.join(BASE_DIR, "chroma_db")
 
+# Shared upstream LLM clients (chat/utils/llm_gateway.py)
+LLM_GATEWAY = {
+    'MAX_CLIENTS': 32,
+    'IDLE_TIMEOUT': 300,
+    'TIMEOUT': 60.0,
+    'COMPLETION_TIMEOUT': 600.0,
+    'CONNECT_TIMEOUT': 10.0,
+    'MAX_RETRIES': 2,
+    'MAX_CONNECTIONS': 100,
+    'MAX_KEEPALIVE_CONNECTIONS': 20,
+}
+
+# Embedding cache in front of every embeddings call (chat/utils/embedding_cache.py)
+EMBEDDING_CACHE = {
+    'LRU_MAX_BYTES': 64 * 1024 * 1024,
+    'MAX_ROWS': 500000,
+    'PRUNE_EVERY': 1000,
+}
+
+# Background ingestion of uploaded files (chat/utils/ingestion.py)
+INGESTION = {
+    'BULK_INSERT_BATCH_SIZE': 500,
+    'HEARTBEAT_INTERVAL': 30,
+}
+
+# Embeddings requests made while ingesting (chat/utils/embedding_executor.py).
+# Batches are cut at BATCH_TOKENS or BATCH_SIZE, whichever comes first.
+EMBEDDING_EXECUTOR = {
+    'CONCURRENCY': 4,
+    'BATCH_TOKENS': 100000,
+    'BATCH_SIZE': 256,
+    'MAX_RETRIES': 6,
+    'BACKOFF': 1.0,
+    'BACKOFF_MAX': 60.0,
+}
+
+# Splitting extracted text into chunks for embedding (chat/utils/chunker.py)
+CHUNKING = {
+    'CHUNKER': 'chat.utils.chunker.StructuredChunker',
+    'CHUNK_TOKENS': 400,
+    'OVERLAP_TOKENS': 50,
+}
+
+# ANN search over DocumentChunk.embedding (chat/utils/vector_search.py).
+# METRIC and INDEX shape the index in a migration; changing them needs a
+# new migration, while EF_SEARCH/PROBES apply per query. STORAGE and
+# DIMENSIONS shape the column: after changing them, use AlterEmbeddingStorage
+# in place of the generated AlterField so stored vectors are converted.
+VECTOR_SEARCH = {
+    'STORAGE': 'halfvec',
+    'DIMENSIONS': 1536,
+    'BINARY_QUANTIZE': False,
+    'BINARY_RERANK': 4,
+    'METRIC': 'cosine',
+    'INDEX': 'hnsw',
+    'HNSW_M': 16,
+    'HNSW_EF_CONSTRUCTION': 64,
+    'HNSW_EF_SEARCH': 40,
+    'IVFFLAT_LISTS': 100,
+    'IVFFLAT_PROBES': 10,
+    'MAX_DISTANCE': 0.5,
+    'HNSW_ITERATIVE_SCAN': None,
+    'TEXT_SEARCH_CONFIG': 'english',
+    'HYBRID_CANDIDATES': 50,
+    'RRF_K': 60,
+}
+
+# Diversifying retrieved chunks before they go into the prompt (chat/utils/rerank.py)
+RERANK = {
+    'ENABLED': True,
+    'CANDIDATES': 20,
+    'LAMBDA': 0.7,
+    'MIN_RELEVANCE': None,
+    'DUPLICATE_SIMILARITY': 0.95,
+}
+
+# Opt-in cache of chat_completion answers (chat/utils/response_cache.py);
+# requests can skip the lookup with "bypass_cache": true
+RESPONSE_CACHE = {
+    'ENABLED': False,
+    'TTL_SECONDS': 24 * 60 * 60,
+    'SIMILARITY_THRESHOLD': 0.05,
+    'MAX_ROWS': 100000,
+    'PRUNE_EVERY': 1000,
+}
+
+# Prompt assembly for chat_completion and regenerate (chat/utils/context_window.py)
+CHAT_CONTEXT = {
+    'TOKEN_BUDGET': 8000,
+    'RESPONSE_RESERVE': 1024,
+    'ENCODING': 'cl100k_base',
+}
+
+# Background folding of old turns into Conversation.summary (chat/utils/summarizer.py)
+CONVERSATION_SUMMARY = {
+    'ENABLED': True,
+    'TRIGGER_TOKENS': 4000,
+    'KEEP_RECENT_TOKENS': 2000,
+    'FOLD_MAX_TOKENS': 6000,
+    'MAX_SUMMARY_TOKENS': 600,
+}
+
+# Incremental sync endpoint (chat/utils/sync.py)
+SYNC = {
+    'SAFETY_WINDOW': 5,
+    'TOMBSTONE_RETENTION_DAYS': 30,
+}
+
+# Cached upstream model lists for fetch_models (chat/utils/model_list.py)
+MODEL_LIST = {
+    'TTL': 300,
+    'STALE_TTL': 3600,
+    'TIMEOUT': 15.0,
+    'MAX_ENTRIES': 256,
+    'WORKERS': 2,
+}
+
+# Per-request query, upstream and retrieval metrics (chat/utils/metrics.py),
+# served in Prometheus format at /metrics and as Server-Timing headers
+METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    # Set one to serve /metrics: a bearer token for the scraper, or the
+    # scraper's addresses when nothing proxies requests to Django
+    'TOKEN': None,
+    'ALLOWED_IPS': [],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -42,7 +42,10 @@ const ImageGenerationButton = ({ isCollapsed = false, onClick }) => {
 
 const Sidebar: React.FC = () => {
   const { isCollapsed, setIsCollapsed } = useSidebar();
-  const { conversations = [], currentConversation, selectConversation, deleteConversation } = useChat();
+  const {
+    conversations = [], currentConversation, selectConversation, deleteConversation,
+    hasMoreConversations, isLoadingMoreConversations, loadMoreConversations
+  } = useChat();
   const { user, logout } = useAuth();
   const { toast } = useToast();
   const [isImageGeneratorOpen, setIsImageGeneratorOpen] = useState(false);
@@ -147,6 +150,17 @@ const Sidebar: React.FC = () => {
                     </Button>
                   </div>
                 ))}
+                {hasMoreConversations && (
+                  <Button
+                    variant="ghost"
+                    size="sm"
+                    onClick={loadMoreConversations}
+                    disabled={isLoadingMoreConversations}
+                    className="w-full text-muted-foreground"
+                  >
+                    {isLoadingMoreConversations ? 'Loading...' : 'Load older conversations'}
+                  </Button>
+                )}
               </div>
             ) : (
               <div className="text-center py-8 text-muted-foreground">
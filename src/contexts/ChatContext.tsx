@@ -15,6 +15,9 @@ interface DocumentChunk {
 
 interface ChatContextType {
   conversations: any[];
+  hasMoreConversations: boolean;
+  isLoadingMoreConversations: boolean;
+  loadMoreConversations: () => Promise<void>;
   currentConversation: any | null;
   isLoading: boolean;
   editingMessageId: string | null;
@@ -41,6 +44,9 @@ interface ChatContextType {
 
 const ChatContext = createContext<ChatContextType>({
   conversations: [],
+  hasMoreConversations: false,
+  isLoadingMoreConversations: false,
+  loadMoreConversations: async () => {},
   currentConversation: null,
   isLoading: false,
   editingMessageId: null,
@@ -90,6 +96,24 @@ axios.interceptors.response.use(
 );
 
 
+// Uploads are chunked and embedded by the backend ingestion worker; poll the
+// jobs so the following completion can already use the file as context.
+const waitForIngestion = async (jobs: any[], timeoutMs = 120000, intervalMs = 1000): Promise<void> => {
+  const deadline = Date.now() + timeoutMs;
+  let pending = jobs.map(job => job.id);
+  
+  while (pending.length > 0 && Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+    const statuses = await Promise.all(
+      pending.map(id => axios.get(`/api/chats/ingestion-jobs/${id}/`))
+    );
+    pending = statuses
+      .map(status => status.data)
+      .filter(job => job.status === 'pending' || job.status === 'running')
+      .map(job => job.id);
+  }
+};
+
 const processFiles = async (files: File[], messageId: string, endpointBaseUrl: string, endpointApiKey: string): Promise<void> => {
   if (!files || files.length === 0) return;
   
@@ -103,11 +127,13 @@ const processFiles = async (files: File[], messageId: string, endpointBaseUrl: s
       formData.append('files', file);
     });
     
-    await axios.post('/api/chats/message-files/upload/', formData, {
+    const response = await axios.post('/api/chats/message-files/upload/', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
+    
+    await waitForIngestion(response.data.jobs || []);
   } catch (error) {
     console.error('Error processing files:', error);
   }
@@ -116,6 +142,9 @@ const processFiles = async (files: File[], messageId: string, endpointBaseUrl: s
 
 export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
   const [conversations, setConversations] = useState<any[]>([]);
+  // Query string of the next, older page of conversations; null once all are loaded
+  const [conversationsNext, setConversationsNext] = useState<string | null>(null);
+  const [isLoadingMoreConversations, setIsLoadingMoreConversations] = useState<boolean>(false);
   const [currentConversation, setCurrentConversation] = useState<any | null>(null);
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const [editingMessageId, setEditingMessageId] = useState<string | null>(null);
@@ -139,16 +168,49 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
 
   
   useEffect(() => {
-    fetchConversations();
+    fetchConversations(true);
   }, []);
 
-  const fetchConversations = async () => {
+  // "next" is an absolute URL built from the backend's own host; only its
+  // cursor is kept, so requests still go through axios.defaults.baseURL
+  const cursorQuery = (next: string | null) => (next ? new URL(next).search : null);
+
+  const fetchConversations = async (reset = false) => {
     try {
+      // Lightweight, cursor-paginated summaries: the first page is the most recent
       const response = await axios.get('/api/chats/conversations/');
-      setConversations(response.data);
+      const firstPage = response.data.results;
+      if (reset) {
+        setConversations(firstPage);
+        setConversationsNext(cursorQuery(response.data.next));
+        return;
+      }
+      // Refreshes keep the older pages already loaded
+      const refreshed = new Set(firstPage.map((conv: any) => conv.id));
+      setConversations(prev => [...firstPage, ...prev.filter(conv => !refreshed.has(conv.id))]);
     } catch (error) {
       console.error('Error fetching conversations:', error);
-      setConversations([]);
+      if (reset) {
+        setConversations([]);
+        setConversationsNext(null);
+      }
+    }
+  };
+
+  const loadMoreConversations = async () => {
+    if (!conversationsNext || isLoadingMoreConversations) return;
+    setIsLoadingMoreConversations(true);
+    try {
+      const response = await axios.get(`/api/chats/conversations/${conversationsNext}`);
+      setConversations(prev => {
+        const loaded = new Set(prev.map(conv => conv.id));
+        return [...prev, ...response.data.results.filter((conv: any) => !loaded.has(conv.id))];
+      });
+      setConversationsNext(cursorQuery(response.data.next));
+    } catch (error) {
+      console.error('Error loading more conversations:', error);
+    } finally {
+      setIsLoadingMoreConversations(false);
     }
   };
 
@@ -179,15 +241,19 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
     
     setIsLoading(true);
     
+    // Saved up front only when files have to be attached to it; otherwise
+    // chat-completion saves both turns
+    let userMessageId: string | undefined;
+    
     try {
       
-      const userMessageResponse = await axios.post(
-        `/api/chats/conversations/${currentConv.id}/add_message/`,
-        { role: 'user', content }
-      );
-      
-      
       if (files.length > 0) {
+        const userMessageResponse = await axios.post(
+          `/api/chats/conversations/${currentConv.id}/add_message/`,
+          { role: 'user', content }
+        );
+        userMessageId = userMessageResponse.data.id;
+        
         await processFiles(
           files,
           userMessageResponse.data.id,
@@ -200,6 +266,7 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
       const aiResponse = await axios.post('/api/chats/chat-completion/', { 
         message: content,
         conversation_id: currentConv.id,
+        user_message_id: userMessageId,
         use_context: files.length > 0,
         endpoint_id: endpointContext.activeEndpoint?.id,
         endpoint_base_url: endpointContext.activeEndpoint?.baseUrl,
@@ -208,21 +275,28 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
       });
       
       
-      await axios.post(
-        `/api/chats/conversations/${currentConv.id}/add_message/`,
-        { role: 'assistant', content: aiResponse.data.response }
+      const now = new Date().toISOString();
+      const newMessages = [
+        { id: aiResponse.data.user_message_id, role: 'user', content, created_at: now, versions: [] },
+        { id: aiResponse.data.assistant_message_id, role: 'assistant', content: aiResponse.data.response, created_at: now, versions: [] }
+      ];
+      setCurrentConversation((conv: any) => conv && conv.id === currentConv.id
+        ? { ...conv, messages: [...(conv.messages || []), ...newMessages] }
+        : conv
       );
       
-      
-      const finalConversation = await axios.get(`/api/chats/conversations/${currentConv.id}/`);
-      setCurrentConversation(finalConversation.data);
-      
       fetchConversations();
     } catch (error) {
       console.error('Error sending message:', error);
       
       if (currentConv) {
         try {
+          if (!userMessageId) {
+            await axios.post(
+              `/api/chats/conversations/${currentConv.id}/add_message/`,
+              { role: 'user', content }
+            );
+          }
           await axios.post(
             `/api/chats/conversations/${currentConv.id}/add_message/`,
             { 
@@ -371,12 +445,7 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
       const version = messageVersions[messageId]?.find(v => v.id === versionId);
       if (!version) return;
       
-      await axios.post(
-        `/api/chats/conversations/${newConversation.id}/add_message/`,
-        { role: 'user', content: version.content }
-      );
-      
-      const aiResponse = await axios.post('/api/chats/chat-completion/', { 
+      await axios.post('/api/chats/chat-completion/', { 
         message: version.content,
         conversation_id: newConversation.id,
         endpoint_id: endpointContext.activeEndpoint?.id,
@@ -385,11 +454,6 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
         endpoint_model: endpointContext.activeEndpoint?.model
       });
       
-      await axios.post(
-        `/api/chats/conversations/${newConversation.id}/add_message/`,
-        { role: 'assistant', content: aiResponse.data.response }
-      );
-      
       await selectConversation(newConversation.id);
     } catch (error) {
       console.error('Error forking conversation:', error);
@@ -430,6 +494,9 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
     <ChatContext.Provider
       value={{
         conversations,
+        hasMoreConversations: conversationsNext !== null,
+        isLoadingMoreConversations,
+        loadMoreConversations,
         currentConversation,
         isLoading,
         editingMessageId,